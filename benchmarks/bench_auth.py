@@ -0,0 +1,78 @@
+"""Per-request overhead of an authenticated request with and without the user cache.
+
+Works on a throwaway copy of ProblemDB.db. A trivial @login_required route that
+returns current_user.id is called through Flask's test client, so the time is
+session + load_user + routing and nothing else:
+    python benchmarks/bench_auth.py --requests 5000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DB = os.path.join(ROOT, "templates/ProblemDB.db")
+
+
+def measure(requests):
+    sys.path.insert(0, ROOT)
+    import run  # noqa: E402  (reads DB_PATH / USER_CACHE_TTL from the environment)
+    from flask_login import current_user, login_required
+
+    @login_required
+    def whoami():
+        return str(current_user.id)
+
+    run.app.add_url_rule("/_bench/whoami", "bench_whoami", whoami)
+    run.app.config["TESTING"] = True
+    client = run.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    # warm up: first request, pool connections, the cache entry
+    for _ in range(50):
+        assert client.get("/_bench/whoami").status_code == 200
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get("/_bench/whoami")
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"us_per_request": elapsed / requests * 1e6, "rps": requests / elapsed}))
+
+
+def run_mode(cache_ttl, requests):
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, "ProblemDB.db")
+    shutil.copyfile(SOURCE_DB, db_path)
+    env = dict(os.environ, DB_PATH=db_path, USER_CACHE_TTL=str(cache_ttl), JUDGE_IN_PROCESS="0")
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(requests)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    shutil.rmtree(tmp_dir)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.requests)
+        return
+
+    before = run_mode(0, args.requests)
+    after = run_mode(30, args.requests)
+    print(f"{'user cache':<12} {'us/request':>11} {'req/s':>8}")
+    print(f"{'off':<12} {before['us_per_request']:>11.1f} {before['rps']:>8.0f}")
+    print(f"{'on':<12} {after['us_per_request']:>11.1f} {after['rps']:>8.0f}")
+    print(f"speedup {before['us_per_request'] / after['us_per_request']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Requests/sec on /api/problems and /run with plain sqlite connections vs. the pooled WAL setup.
+
+Works on a throwaway copy of ProblemDB.db. Requests go through Flask's test client
+from several threads, so the numbers are app + database cost without HTTP overhead:
+    python benchmarks/bench_db.py --threads 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DB = os.path.join(ROOT, "templates/ProblemDB.db")
+
+
+def load_test(threads, seconds):
+    sys.path.insert(0, ROOT)
+    import run  # noqa: E402  (reads DB_PATH / DB_POOL from the environment)
+
+    run.app.config["TESTING"] = True
+    targets = {
+        "/api/problems": lambda c: c.get("/api/problems?page=1&per_page=10&q=a"),
+        "/run": lambda c: c.post("/run", json={"problem_id": 1, "code": "def solution(a, b):\n    return a - b\n"}),
+    }
+    report = {}
+    for name, request in targets.items():
+        counts = [0] * threads
+        errors = [0] * threads
+        stop = time.perf_counter() + seconds
+
+        def hammer(i):
+            client = run.app.test_client()
+            with client.session_transaction() as session:
+                session["_user_id"] = "1"
+                session["_fresh"] = True
+            while time.perf_counter() < stop:
+                if request(client).status_code == 200:
+                    counts[i] += 1
+                else:
+                    errors[i] += 1
+
+        workers = [threading.Thread(target=hammer, args=(i,)) for i in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        report[name] = {"rps": sum(counts) / seconds, "errors": sum(errors)}
+    print(json.dumps(report))
+
+
+def run_mode(pooled, threads, seconds):
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, "ProblemDB.db")
+    shutil.copyfile(SOURCE_DB, db_path)
+    if not pooled:
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+    env = dict(os.environ, DB_PATH=db_path, DB_POOL="1" if pooled else "0", JUDGE_IN_PROCESS="0")
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", "--threads", str(threads), "--seconds", str(seconds)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    shutil.rmtree(tmp_dir)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        load_test(args.threads, args.seconds)
+        return
+
+    before = run_mode(False, args.threads, args.seconds)
+    after = run_mode(True, args.threads, args.seconds)
+    print(f"{'endpoint':<15} {'before req/s':>13} {'after req/s':>12} {'speedup':>8}")
+    for name in before:
+        b, a = before[name]["rps"], after[name]["rps"]
+        print(f"{name:<15} {b:>13.0f} {a:>12.0f} {a / b:>7.2f}x"
+              f"  (errors {before[name]['errors']} -> {after[name]['errors']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-submission wall time: one `docker run --rm` per test case vs. the warm container pool.
+
+Run from the project folder with docker and the python-sandbox image available:
+    python benchmarks/bench_sandbox.py --rounds 5
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox import SANDBOX_DIR, EXEC_TIMEOUT, ColdSandbox, ContainerPool, Lease  # noqa: E402
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates/ProblemDB.db")
+
+BENCH_CODE = """
+import sys, json
+def solution(*args):
+    return None
+if __name__ == "__main__":
+    try:
+        print(json.dumps({"return": solution(*json.loads(sys.argv[1])), "printed": ""}))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+"""
+
+
+def load_problems():
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    problems = {}
+    for problem_id, case_input in conn.execute("SELECT problem_id, input FROM test_cases ORDER BY problem_id, id"):
+        problems.setdefault(problem_id, []).append(case_input)
+    conn.close()
+    return problems
+
+
+def run_submission(box, script, cases):
+    start = time.perf_counter()
+    for case_input in cases:
+        box.exec(["python3", f"/app/{script}", case_input], timeout=EXEC_TIMEOUT)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    script = "bench_solution.py"
+    with open(os.path.join(SANDBOX_DIR, script), "w") as f:
+        f.write(BENCH_CODE)
+
+    problems = load_problems()
+
+    pool = ContainerPool(1)
+    start = time.perf_counter()
+    pool.start()
+    print(f"pool warm-up (not counted): {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    cold = ColdSandbox()
+    print(f"{'problem':>8} {'cases':>6} {'cold ms':>10} {'pool ms':>10} {'speedup':>8}")
+    for problem_id, cases in problems.items():
+        cold_times, pool_times = [], []
+        for _ in range(args.rounds):
+            cold_times.append(run_submission(cold, script, cases))
+            with Lease(pool) as box:
+                pool_times.append(run_submission(box, script, cases))
+        cold_ms = statistics.median(cold_times) * 1000
+        pool_ms = statistics.median(pool_times) * 1000
+        print(f"{problem_id:>8} {len(cases):>6} {cold_ms:>10.0f} {pool_ms:>10.0f} {cold_ms / pool_ms:>7.1f}x")
+
+    pool.shutdown()
+    os.remove(os.path.join(SANDBOX_DIR, script))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after they were set.
+
+    Size is capped at `maxsize`; the least recently used entry is evicted first.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            item = self.data.pop(key, None)
+            return default if item is None else item[0]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class CachedCount:
+    """A row count computed once with `compute(conn)` and then kept current with add().
+
+    It is recomputed every `ttl` seconds so writes from other processes are picked up
+    eventually; in between the value may be slightly off, which is fine for page counts.
+    """
+
+    def __init__(self, compute, ttl=600):
+        self.compute = compute
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def get(self, conn):
+        with self.lock:
+            if self.value is not None and self.expires > time.monotonic():
+                return self.value
+        value = self.compute(conn)
+        with self.lock:
+            self.value = value
+            self.expires = time.monotonic() + self.ttl
+        return value
+
+    def add(self, n=1):
+        with self.lock:
+            if self.value is not None:
+                self.value = max(0, self.value + n)
+
+    def invalidate(self):
+        with self.lock:
+            self.value = None
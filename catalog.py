@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from cache import TTLCache
+
+# ---------------------- Catalog Cache ----------------------
+# Serialized /problems and /problem/<id> payloads, keyed by the catalog version.
+# Every admin route that changes a problem or its test cases bumps the version in
+# the same transaction, so old entries are simply never asked for again, in this
+# process or any other sharing the DB. The version is also the ETag prefix.
+PAYLOAD_CACHE_SIZE = 512
+PAYLOAD_CACHE_TTL = 3600
+payload_cache = TTLCache(maxsize=PAYLOAD_CACHE_SIZE, ttl=PAYLOAD_CACHE_TTL)
+
+
+def init_catalog_version(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO catalog_version (id) VALUES (1);
+    """)
+    conn.commit()
+
+
+def version(conn):
+    return conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+
+def bump(conn):
+    """Mark every cached catalog payload stale; caller commits."""
+    conn.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+
+def payload(key, catalog_version, build):
+    """(body, etag) for `key` at `catalog_version`; build() makes the JSON-able value on a miss.
+
+    Returns None when build() does (e.g. no such problem); that isn't cached.
+    """
+    cached = payload_cache.get((key, catalog_version))
+    if cached is None:
+        value = build()
+        if value is None:
+            return None
+        body = json.dumps(value).encode()
+        etag = f"{catalog_version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        cached = (body, etag)
+        payload_cache.set((key, catalog_version), cached)
+    return cached
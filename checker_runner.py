@@ -0,0 +1,33 @@
+"""Runs one custom checker call in its own process; started by checkers.run_custom.
+
+    python3 checker_runner.py < {"code", "args", "returned", "expected"}
+
+The problem's checker_code is loaded and check(args, returned, expected) is
+called once. A single JSON line {"ok", "message"} is written to stdout, or
+{"failed", "message"} when the checker raised. Time, memory and process
+limits are set by the judge before this starts, so a hung or greedy checker
+only takes this process down.
+"""
+import json
+import sys
+
+
+def main():
+    data = json.loads(sys.stdin.read())
+    # anything the checker prints goes to stderr, stdout carries only the answer
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        module = {"__name__": "checker"}
+        exec(compile(data["code"], "<checker>", "exec"), module)
+        answer = module["check"](data["args"], data["returned"], data["expected"])
+        ok, message = answer if isinstance(answer, tuple) else (answer, "")
+        result = {"ok": bool(ok), "message": str(message)}
+    except Exception as e:
+        result = {"failed": True, "message": f"{type(e).__name__}: {e}"}
+    out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
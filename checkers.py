@@ -0,0 +1,181 @@
+import hashlib
+import json
+import math
+import os
+import re
+import resource
+import subprocess
+import sys
+from collections import Counter
+from itertools import zip_longest
+
+import testdata
+from cache import TTLCache
+
+# ---------------------- Output Checkers ----------------------
+# How a problem decides whether a returned value matches the expected one:
+#   exact      returned == expected (the old behaviour)
+#   float      numbers anywhere in the value may differ by checker_arg (default 1e-6),
+#              absolute or relative to the expected number
+#   unordered  the returned list holds the same elements in any order
+#   tokens     the whitespace separated tokens of both sides are equal
+#   custom     checker_code defines check(args, returned, expected) -> bool or
+#              (bool, message); it runs on the judge host once the case is back, in a
+#              child process (checker_runner.py) under CHECKER_* limits, on the original
+#              args, so user code never sees expected
+CHECKERS = ("exact", "float", "unordered", "tokens", "custom")
+DEFAULT_TOLERANCE = 1e-6
+
+# parsed test cases per (test case fingerprint, checker), so a submission doesn't
+# json.loads every input and expected value again
+PREPARED_CACHE_SIZE = 64
+PREPARED_CACHE_TTL = 3600
+prepared_cache = TTLCache(maxsize=PREPARED_CACHE_SIZE, ttl=PREPARED_CACHE_TTL)
+
+# a custom checker call gets CHECKER_TIMEOUT seconds, CHECKER_MEMORY MB and no child
+# processes or file writes; CHECKER_USER (when the judge runs as root) drops privileges too
+CHECKER_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checker_runner.py")
+CHECKER_TIMEOUT = 5
+CHECKER_MEMORY = 512
+CHECKER_USER = os.environ.get("CHECKER_USER") or None
+
+
+def checker_config(problem):
+    """{"name", "arg", "code", "id"} from a problems row; "id" changes whenever any of them does."""
+    keys = problem.keys() if problem is not None else []
+    name = problem["checker"] if "checker" in keys and problem["checker"] in CHECKERS else "exact"
+    arg = problem["checker_arg"] if "checker_arg" in keys else None
+    code = problem["checker_code"] if "checker_code" in keys else None
+    if name == "custom" and not code:
+        name = "exact"
+    digest = hashlib.sha256(json.dumps([name, arg, code if name == "custom" else None]).encode()).hexdigest()
+    return {"name": name, "arg": arg, "code": code, "id": f"{name}-{digest[:12]}"}
+
+
+def tolerance(config):
+    try:
+        return float(config["arg"]) if config["arg"] else DEFAULT_TOLERANCE
+    except ValueError:
+        return DEFAULT_TOLERANCE
+
+
+def canonical(value):
+    # hashable, order-stable form of a JSON value, for counting elements
+    return json.dumps(value, sort_keys=True)
+
+
+def prepare(config, expected):
+    """What check() compares against; built once per test case and cached."""
+    if config["name"] == "unordered" and isinstance(expected, list):
+        return Counter(canonical(v) for v in expected)
+    return expected
+
+
+def file_label(case, name):
+    return f"[file {case[name + '_ref'][:12]}, {case[name + '_size']} bytes]"
+
+
+def prepare_cases(test_cases, config, fingerprint):
+    """[{"input", "expected", "prepared", "expected_file", "line"}] for the test_cases rows; "line" is the harness stdin line.
+
+    "input"/"expected" are what gets stored with the results: the values, or a
+    short label for file-backed ones, which the harness reads from the data mount.
+    Only the input is ever sent to the sandbox; a custom checker gets the args
+    back from "input_text"/"input_ref" on the host.
+    """
+    key = (fingerprint, config["id"])
+    cases = prepared_cache.get(key)
+    if cases is None:
+        cases = []
+        for case in test_cases:
+            expected = json.loads(testdata.case_text(case, "expected"))
+            if case["input_ref"]:
+                args = file_label(case, "input")
+                line = json.dumps({"args_file": testdata.sandbox_path(case["input_ref"])})
+            else:
+                args = json.loads(case["input"])
+                line = json.dumps(args)
+            cases.append({
+                "input": args,
+                "expected": file_label(case, "expected") if case["expected_ref"] else expected,
+                "prepared": prepare(config, expected),
+                "expected_file": bool(case["expected_ref"]),
+                "input_text": None if case["input_ref"] else case["input"],
+                "input_ref": case["input_ref"],
+                "line": line,
+            })
+        prepared_cache.set(key, cases)
+    return cases
+
+
+def checker_limits():
+    resource.setrlimit(resource.RLIMIT_CPU, (CHECKER_TIMEOUT, CHECKER_TIMEOUT + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (CHECKER_MEMORY * 1024 * 1024,) * 2)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+
+
+def run_custom(config, case, returned):
+    """{"ok", "message"} of the problem's check(args, returned, expected); "failed" when the checker itself broke."""
+    # the args go over as the stored text, so nothing the user code did to its copy can leak in
+    args_text = case["input_text"] if case["input_ref"] is None else testdata.read(case["input_ref"], "input")
+    request = (f'{{"code": {json.dumps(config["code"])}, "returned": {json.dumps(returned)}, '
+               f'"expected": {json.dumps(case["prepared"])}, "args": {args_text}}}')
+    try:
+        proc = subprocess.run([sys.executable, "-I", CHECKER_RUNNER], input=request.encode(), stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=CHECKER_TIMEOUT, preexec_fn=checker_limits, user=CHECKER_USER,
+                              cwd="/", env={})
+        answer = json.loads(proc.stdout)
+    except subprocess.TimeoutExpired:
+        answer = {"failed": True, "message": f"time limit ({CHECKER_TIMEOUT} s) exceeded"}
+    except ValueError:
+        # killed by a limit (or crashed) before it could answer
+        answer = {"failed": True, "message": f"exited with code {proc.returncode}"}
+    if answer.get("failed"):
+        return {"ok": False, "message": f"Checker failed: {answer['message']}", "failed": True}
+    return {"ok": bool(answer["ok"]), "message": str(answer["message"])}
+
+
+def check(config, returned, prepared):
+    name = config["name"]
+    if name == "float":
+        return close(returned, prepared, tolerance(config))
+    if name == "unordered":
+        if not isinstance(prepared, Counter):
+            return returned == prepared
+        if not isinstance(returned, list) or len(returned) != sum(prepared.values()):
+            return False
+        return Counter(canonical(v) for v in returned) == prepared
+    if name == "tokens":
+        # both sides are walked token by token and the first difference ends the comparison
+        missing = object()
+        return all(a == b for a, b in zip_longest(tokens(returned), tokens(prepared), fillvalue=missing))
+    return returned == prepared
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def close(returned, expected, tol):
+    if is_number(returned) and is_number(expected):
+        if math.isnan(expected) or math.isinf(expected):
+            return returned == expected or (math.isnan(expected) and math.isnan(returned))
+        return abs(returned - expected) <= tol * max(1.0, abs(expected))
+    if isinstance(returned, list) and isinstance(expected, list):
+        return len(returned) == len(expected) and all(close(a, b, tol) for a, b in zip(returned, expected))
+    if isinstance(returned, dict) and isinstance(expected, dict):
+        return returned.keys() == expected.keys() and all(close(returned[k], expected[k], tol) for k in expected)
+    return returned == expected
+
+
+def tokens(value):
+    """Whitespace separated tokens of a value, lazily; lists are read in order, other values as their text."""
+    if isinstance(value, str):
+        for match in re.finditer(r"\S+", value):
+            yield match.group()
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from tokens(item)
+    elif value is not None:
+        yield json.dumps(value) if isinstance(value, (bool, dict)) else str(value)
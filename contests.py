@@ -0,0 +1,506 @@
+import bisect
+import random
+import threading
+import time
+
+from cache import TTLCache
+from db import add_column
+
+# ---------------------- Contest Tables ----------------------
+# A contest is a set of problems (labelled A, B, ...) open between start_time and
+# end_time (epoch seconds) to the users registered for it. Contest submissions are
+# ordinary submissions plus a contest_submissions row; when the judge stores the
+# first verdict of one it appends a contest_verdicts row in the same transaction.
+# That log, in seq order, is all a scoreboard needs.
+
+
+def init_contests(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS contests (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        start_time REAL NOT NULL,
+        end_time REAL NOT NULL,
+        freeze_minutes INTEGER NOT NULL DEFAULT 0,
+        penalty_minutes INTEGER NOT NULL DEFAULT 20,
+        unfrozen INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS contest_problems (
+        contest_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        PRIMARY KEY (contest_id, problem_id)
+    );
+    CREATE TABLE IF NOT EXISTS contest_registrations (
+        contest_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        registered_at REAL NOT NULL,
+        UNIQUE (contest_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS contest_submissions (
+        submission_id TEXT PRIMARY KEY,
+        contest_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        submitted_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS contest_verdicts (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        contest_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        submission_id TEXT NOT NULL,
+        submitted_at REAL NOT NULL,
+        accepted INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_contest_verdicts_contest ON contest_verdicts (contest_id, seq);
+    """)
+    # tells a contest from an earlier, deleted one that had the same id
+    add_column(conn, "contests", "created_at", "REAL")
+    conn.commit()
+
+
+def problem_label(index):
+    label = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        label = chr(ord("A") + rest) + label
+    return label
+
+
+def create_contest(conn, title, description, start_time, end_time, freeze_minutes, penalty_minutes, problem_ids):
+    """Insert a contest and its problems (labelled in the given order); caller commits."""
+    contest_id = conn.execute(
+        "INSERT INTO contests (title, description, start_time, end_time, freeze_minutes, penalty_minutes, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (title, description, start_time, end_time, freeze_minutes, penalty_minutes, time.time())
+    ).lastrowid
+    conn.executemany(
+        "INSERT OR IGNORE INTO contest_problems (contest_id, problem_id, label) VALUES (?, ?, ?)",
+        [(contest_id, problem_id, problem_label(i)) for i, problem_id in enumerate(problem_ids)]
+    )
+    return contest_id
+
+
+def delete_contest(conn, contest_id):
+    # the submissions themselves stay; their contest rows go, or a contest that gets
+    # the same id later would inherit them
+    for table in ("contest_problems", "contest_registrations", "contest_submissions", "contest_verdicts"):
+        conn.execute(f"DELETE FROM {table} WHERE contest_id = ?", (contest_id,))
+    conn.execute("DELETE FROM contests WHERE id = ?", (contest_id,))
+    with boards_lock:
+        boards.pop(contest_id, None)
+
+
+def unfreeze(conn, contest_id):
+    # version changes so every process's scoreboard notices on its next sync
+    conn.execute("UPDATE contests SET unfrozen = 1, version = version + 1 WHERE id = ?", (contest_id,))
+
+
+def get_contest(conn, contest_id):
+    return conn.execute("SELECT * FROM contests WHERE id = ?", (contest_id,)).fetchone()
+
+
+def contest_problems(conn, contest_id):
+    return conn.execute(
+        "SELECT cp.problem_id, cp.label, p.title, p.diff FROM contest_problems cp "
+        "LEFT JOIN problems p ON p.id = cp.problem_id WHERE cp.contest_id = ? "
+        "ORDER BY length(cp.label), cp.label",
+        (contest_id,)
+    ).fetchall()
+
+
+def phase(contest, now=None):
+    now = time.time() if now is None else now
+    if now < contest["start_time"]:
+        return "upcoming"
+    if now < contest["end_time"]:
+        return "running"
+    return "finished"
+
+
+def freeze_at(contest):
+    """Submissions from this time on stay hidden on the public board until unfreeze; None = no freeze."""
+    if not contest["freeze_minutes"]:
+        return None
+    return contest["end_time"] - contest["freeze_minutes"] * 60
+
+
+def is_registered(conn, contest_id, user_id):
+    return conn.execute(
+        "SELECT 1 FROM contest_registrations WHERE contest_id = ? AND user_id = ?", (contest_id, user_id)
+    ).fetchone() is not None
+
+
+def register(conn, contest_id, user_id):
+    """Register `user_id`; False if they already were. Caller commits."""
+    return conn.execute(
+        "INSERT OR IGNORE INTO contest_registrations (contest_id, user_id, registered_at) VALUES (?, ?, ?)",
+        (contest_id, user_id, time.time())
+    ).rowcount == 1
+
+
+def record_submission(conn, submission_id, contest_id, user_id, problem_id):
+    conn.execute(
+        "INSERT INTO contest_submissions (submission_id, contest_id, user_id, problem_id, submitted_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (submission_id, contest_id, user_id, problem_id, time.time())
+    )
+
+
+def record_verdict(conn, submission_id, accepted):
+    """Log the verdict if `submission_id` is a contest submission; result_store calls it once per submission."""
+    conn.execute(
+        "INSERT INTO contest_verdicts (contest_id, user_id, problem_id, submission_id, submitted_at, accepted) "
+        "SELECT contest_id, user_id, problem_id, submission_id, submitted_at, ? "
+        "FROM contest_submissions WHERE submission_id = ?",
+        (int(accepted), submission_id)
+    )
+
+
+# ---------------------- Ranked List ----------------------
+# Indexable skip list: a sorted list with O(log n) expected insert, remove, rank
+# (number of smaller values) and lookup by position. Each link stores how many
+# positions it skips, so positions are counted on the way down.
+MAX_LEVEL = 24
+
+
+class RankNode:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, level):
+        self.value = value
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class RankedList:
+    def __init__(self):
+        self.head = RankNode(None, MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def path(self, value):
+        # the last node before `value` on each level, and its position (head = 0)
+        chain = [None] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node, position = self.head, 0
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, value):
+        chain, positions = self.path(value)
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        node = RankNode(value, level)
+        position = positions[0]
+        for i in range(level):
+            before = chain[i]
+            node.next[i] = before.next[i]
+            before.next[i] = node
+            node.width[i] = before.width[i] - (position - positions[i])
+            before.width[i] = position - positions[i] + 1
+        for i in range(level, MAX_LEVEL):
+            chain[i].width[i] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain, _ = self.path(value)
+        node = chain[0].next[0]
+        if node is None or node.value != value:
+            raise ValueError(f"{value!r} not in list")
+        for i in range(len(node.next)):
+            chain[i].width[i] += node.width[i] - 1
+            chain[i].next[i] = node.next[i]
+        for i in range(len(node.next), MAX_LEVEL):
+            chain[i].width[i] -= 1
+        self.size -= 1
+
+    def rank(self, value):
+        """How many values are smaller than `value`."""
+        return self.path(value)[1][0]
+
+    def node_at(self, index):
+        node, remaining = self.head, index + 1
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start, count):
+        """Up to `count` values from position `start` on."""
+        if start >= self.size or count <= 0:
+            return []
+        node = self.node_at(max(start, 0))
+        values = []
+        while node is not None and len(values) < count:
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+
+# ---------------------- Scoreboard ----------------------
+# ICPC rules: more solved problems first, then less penalty. A solved problem
+# costs the minutes from the start to its first accepted submission plus
+# penalty_minutes per rejected submission made before that one. Equal
+# (solved, penalty) share a rank; the earlier last accept is listed first.
+class Standing:
+    __slots__ = ("user_id", "username", "solved", "penalty", "last_accept", "cells")
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        self.solved = 0
+        self.penalty = 0
+        self.last_accept = 0
+        # problem_id -> {"accepted_at": seconds from start or None, "rejected": sorted seconds, "pending": n}
+        self.cells = {}
+
+    def key(self):
+        return (-self.solved, self.penalty, self.last_accept, self.user_id)
+
+
+def cell_score(cell, penalty_minutes):
+    """(solved, penalty minutes) of one problem of one contestant."""
+    if cell["accepted_at"] is None:
+        return 0, 0
+    tries = bisect.bisect_left(cell["rejected"], cell["accepted_at"])
+    return 1, int(cell["accepted_at"] // 60) + penalty_minutes * tries
+
+
+class Scoreboard:
+    def __init__(self, penalty_minutes):
+        self.penalty_minutes = penalty_minutes
+        self.standings = {}
+        self.ranking = RankedList()
+        # while replaying a whole contest the ranking is built once at the end (rank_all)
+        self.deferred = False
+
+    def rank_all(self):
+        self.ranking = RankedList()
+        for key in sorted(standing.key() for standing in self.standings.values()):
+            self.ranking.insert(key)
+        self.deferred = False
+
+    def standing(self, user_id, username=None):
+        standing = self.standings.get(user_id)
+        if standing is None:
+            standing = self.standings[user_id] = Standing(user_id, username or f"user {user_id}")
+            if not self.deferred:
+                self.ranking.insert(standing.key())
+        elif username:
+            standing.username = username
+        return standing
+
+    def apply(self, user_id, username, problem_id, elapsed, accepted, pending=False):
+        """One judged submission, `elapsed` seconds after the start; pending=True only marks it as hidden."""
+        standing = self.standing(user_id, username)
+        cell = standing.cells.setdefault(problem_id, {"accepted_at": None, "rejected": [], "pending": 0})
+        if pending:
+            cell["pending"] += 1
+            return
+        if not self.deferred:
+            self.ranking.remove(standing.key())
+        solved, penalty = cell_score(cell, self.penalty_minutes)
+        if accepted:
+            # verdicts can arrive out of submission order; the earliest accept counts
+            if cell["accepted_at"] is None or elapsed < cell["accepted_at"]:
+                cell["accepted_at"] = elapsed
+        else:
+            bisect.insort(cell["rejected"], elapsed)
+        new_solved, new_penalty = cell_score(cell, self.penalty_minutes)
+        standing.solved += new_solved - solved
+        standing.penalty += new_penalty - penalty
+        standing.last_accept = max((c["accepted_at"] for c in standing.cells.values()
+                                    if c["accepted_at"] is not None), default=0)
+        if not self.deferred:
+            self.ranking.insert(standing.key())
+
+    def rank_of(self, standing):
+        return self.ranking.rank((-standing.solved, standing.penalty)) + 1
+
+    def rows(self, keys, labels):
+        rows = []
+        for key in keys:
+            standing = self.standings[key[3]]
+            problems = {}
+            for problem_id, label in labels.items():
+                cell = standing.cells.get(problem_id)
+                if cell is None:
+                    problems[label] = {"solved": False, "time": None, "tries": 0, "pending": 0}
+                    continue
+                accepted_at = cell["accepted_at"]
+                tries = (bisect.bisect_left(cell["rejected"], accepted_at) if accepted_at is not None
+                         else len(cell["rejected"]))
+                problems[label] = {
+                    "solved": accepted_at is not None,
+                    "time": int(accepted_at // 60) if accepted_at is not None else None,
+                    "tries": tries,
+                    "pending": cell["pending"],
+                }
+            rows.append({
+                "rank": self.rank_of(standing),
+                "user_id": standing.user_id,
+                "username": standing.username,
+                "solved": standing.solved,
+                "penalty": standing.penalty,
+                "problems": problems,
+            })
+        return rows
+
+
+# ---------------------- Contest Boards ----------------------
+# One in-memory board per contest and process. A sync applies only what is new
+# since the last one (registrations by rowid, verdicts by seq), at most once per
+# SYNC_INTERVAL however many clients are refreshing; rebuilding from scratch only
+# happens on first use or when the contest row's version changes. During a freeze
+# the public board only takes submissions made before freeze_at; later ones show
+# as pending until an admin unfreezes it.
+SYNC_INTERVAL = 1.0
+PAGE_SIZE = 50
+PAGE_SIZE_MAX = 200
+AROUND_RADIUS = 10
+PAGE_CACHE_SIZE = 512
+page_cache = TTLCache(maxsize=PAGE_CACHE_SIZE, ttl=60)
+
+
+def stamp(contest):
+    return contest["created_at"], contest["version"]
+
+
+class ContestBoard:
+    def __init__(self, contest_id):
+        self.contest_id = contest_id
+        self.contest = None
+        self.lock = threading.Lock()
+        self.synced_at = 0
+        # bumped on every change, rebuilds included; part of the page cache key
+        self.changes = 0
+        self.reset(None, {})
+
+    def reset(self, contest, labels):
+        self.contest = contest
+        self.labels = labels
+        penalty_minutes = contest["penalty_minutes"] if contest else 0
+        self.live = Scoreboard(penalty_minutes)
+        self.public = Scoreboard(penalty_minutes)
+        self.last_registration = 0
+        self.last_seq = 0
+
+    def sync(self, conn, force=False):
+        with self.lock:
+            if not force and time.monotonic() - self.synced_at < SYNC_INTERVAL:
+                return
+            self.synced_at = time.monotonic()
+            contest = get_contest(conn, self.contest_id)
+            if contest is None or self.contest is None or stamp(contest) != stamp(self.contest):
+                labels = {row["problem_id"]: row["label"] for row in contest_problems(conn, self.contest_id)}
+                self.reset(dict(contest) if contest else None, labels)
+                self.changes += 1
+                if contest is None:
+                    return
+                self.live.deferred = self.public.deferred = True
+            registrations = conn.execute(
+                "SELECT r.rowid, r.user_id, u.username FROM contest_registrations r "
+                "LEFT JOIN users u ON u.id = r.user_id WHERE r.rowid > ? AND r.contest_id = ? ORDER BY r.rowid",
+                (self.last_registration, self.contest_id)
+            ).fetchall()
+            for row in registrations:
+                self.live.standing(row["user_id"], row["username"])
+                self.public.standing(row["user_id"], row["username"])
+                self.last_registration = row["rowid"]
+            verdicts = conn.execute(
+                "SELECT v.seq, v.user_id, u.username, v.problem_id, v.submitted_at, v.accepted "
+                "FROM contest_verdicts v LEFT JOIN users u ON u.id = v.user_id "
+                "WHERE v.contest_id = ? AND v.seq > ? ORDER BY v.seq",
+                (self.contest_id, self.last_seq)
+            ).fetchall()
+            frozen_from = freeze_at(self.contest)
+            for row in verdicts:
+                elapsed = max(0.0, row["submitted_at"] - self.contest["start_time"])
+                self.live.apply(row["user_id"], row["username"], row["problem_id"], elapsed, row["accepted"])
+                hidden = frozen_from is not None and row["submitted_at"] >= frozen_from
+                self.public.apply(row["user_id"], row["username"], row["problem_id"], elapsed, row["accepted"],
+                                  pending=hidden)
+                self.last_seq = row["seq"]
+            for board in (self.live, self.public):
+                if board.deferred:
+                    board.rank_all()
+            if registrations or verdicts:
+                self.changes += 1
+
+    def view(self, live):
+        """The board to show: the live one for admins (live=True) or once unfrozen, else the public one."""
+        frozen = freeze_at(self.contest) is not None and not self.contest["unfrozen"]
+        return self.public if frozen and not live else self.live
+
+    def page(self, offset, limit, live=False):
+        # created_at too: another process's cache may still hold pages of a deleted contest with this id
+        key = (self.contest_id, self.contest and self.contest["created_at"], self.changes, live, offset, limit)
+        cached = page_cache.get(key)
+        if cached is not None:
+            return cached
+        with self.lock:
+            board = self.view(live)
+            result = {
+                "total": len(board.ranking),
+                "offset": offset,
+                "rows": board.rows(board.ranking.slice(offset, limit), self.labels),
+            }
+        page_cache.set(key, result)
+        return result
+
+    def around(self, user_id, radius, live=False):
+        """The rows within `radius` places of `user_id`; None if they aren't on the board."""
+        with self.lock:
+            board = self.view(live)
+            standing = board.standings.get(user_id)
+            if standing is None:
+                return None
+            position = board.ranking.rank(standing.key())
+            offset = max(0, position - radius)
+            return {
+                "total": len(board.ranking),
+                "offset": offset,
+                "position": position,
+                "rows": board.rows(board.ranking.slice(offset, 2 * radius + 1), self.labels),
+            }
+
+    def status(self, live=False):
+        frozen = freeze_at(self.contest) is not None and not self.contest["unfrozen"] and not live
+        return {
+            "contest_id": self.contest_id,
+            "problems": list(self.labels.values()),
+            "frozen": frozen and time.time() >= freeze_at(self.contest),
+            "freeze_at": freeze_at(self.contest),
+        }
+
+
+boards = {}
+boards_lock = threading.Lock()
+
+
+def scoreboard(conn, contest_id):
+    """The synced ContestBoard of `contest_id`, or None if there is no such contest."""
+    with boards_lock:
+        board = boards.get(contest_id)
+        if board is None:
+            board = boards[contest_id] = ContestBoard(contest_id)
+    board.sync(conn)
+    if board.contest is None:
+        with boards_lock:
+            boards.pop(contest_id, None)
+        return None
+    return board
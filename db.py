@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import threading
+
+# ---------------------- DB Settings ----------------------
+DB_PATH = os.environ.get(
+    "DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates/ProblemDB.db")
+)
+
+# DB_POOL=0 goes back to one plain connection per call (used by benchmarks/bench_db.py)
+USE_CONNECTION_POOL = os.environ.get("DB_POOL", "1") == "1"
+POOL_SIZE = 16
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+# ---------------------- Connection Pool ----------------------
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool instead of closing it.
+
+    A thread keeps the same connection while it has one checked out, so nested
+    get_db_connection()/close() pairs share it and only the outermost close returns it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.depth = 0
+
+    def close(self):
+        self.depth -= 1
+        if self.depth <= 0:
+            self.pool.put(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path, maxsize=POOL_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.idle = []
+        self.local = threading.local()
+        self.pid = os.getpid()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, factory=PooledConnection,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        conn.pool = self
+        # WAL lets the web app read while the judge writes; NORMAL is still crash-safe under WAL
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def get(self):
+        if os.getpid() != self.pid:
+            # never share sqlite handles across a fork
+            self.idle = []
+            self.local = threading.local()
+            self.pid = os.getpid()
+
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = self.connect()
+            self.local.conn = conn
+        conn.depth += 1
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def put(self, conn):
+        conn.depth = 0
+        if conn.in_transaction:
+            conn.rollback()
+        if getattr(self.local, "conn", None) is conn:
+            self.local.conn = None
+        with self.lock:
+            if len(self.idle) < self.maxsize:
+                self.idle.append(conn)
+                return
+        conn.really_close()
+
+    def release(self):
+        # hand back whatever this thread still holds, e.g. after an exception skipped close()
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            self.put(conn)
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+def get_db_connection():
+    if not USE_CONNECTION_POOL:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return pool.get()
+
+
+def release_connection():
+    if USE_CONNECTION_POOL:
+        pool.release()
+
+
+# ---------------------- Indexes ----------------------
+# Columns the app looks rows up by: judge/result updates by UniqID, user history by
+# userID ordered by subTime, test cases per problem and per-case results per submission
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_submissions_uniqid ON submissions (UniqID)",
+    "CREATE INDEX IF NOT EXISTS idx_submissions_user_time ON submissions (userID, subTime)",
+    "CREATE INDEX IF NOT EXISTS idx_submissions_time ON submissions (subTime)",
+    "CREATE INDEX IF NOT EXISTS idx_test_cases_problem ON test_cases (problem_id)",
+    "CREATE INDEX IF NOT EXISTS idx_testcasesub_sub ON testcaseSub (subID)",
+]
+
+
+def init_indexes(conn):
+    for sql in INDEXES:
+        conn.execute(sql)
+    conn.commit()
+
+
+# ---------------------- Columns ----------------------
+# Columns added to the original tables after the fact: (table, column, declaration)
+COLUMNS = [
+    # "sequential" runs cases one after another in one sandbox, "parallel" spreads them over idle ones
+    ("problems", "exec_policy", "TEXT NOT NULL DEFAULT 'sequential'"),
+    # wall-clock seconds for all test cases of one submission together; NULL = judge default
+    ("problems", "total_time_limit", "REAL"),
+    # per-case sandbox limits (sandbox.LIMIT_COLUMNS); NULL = sandbox.DEFAULT_LIMITS
+    ("problems", "cpu_time_limit", "REAL"),
+    ("problems", "wall_time_limit", "REAL"),
+    ("problems", "memory_limit", "INTEGER"),
+    ("problems", "pids_limit", "INTEGER"),
+    ("problems", "output_limit", "INTEGER"),
+    # how returned values are compared (checkers.CHECKERS); checker_arg is e.g. the float
+    # tolerance, checker_code the source of a custom checker
+    ("problems", "checker", "TEXT NOT NULL DEFAULT 'exact'"),
+    ("problems", "checker_arg", "TEXT"),
+    ("problems", "checker_code", "TEXT"),
+    # inputs/expected outputs over testdata.INLINE_LIMIT live in content-addressed files;
+    # the column is then '' and *_ref holds the file's sha256
+    ("test_cases", "input_ref", "TEXT"),
+    ("test_cases", "input_size", "INTEGER"),
+    ("test_cases", "expected_ref", "TEXT"),
+    ("test_cases", "expected_size", "INTEGER"),
+    # judge.RUN_MODES; only "submit" counts as an attempt in user_stats
+    ("submissions", "mode", "TEXT NOT NULL DEFAULT 'submit'"),
+]
+
+
+def add_column(conn, table, column, declaration):
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column in existing:
+        return
+    try:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    except sqlite3.OperationalError as e:
+        # another process added it first
+        if "duplicate column" not in str(e):
+            raise
+
+
+def init_schema(conn):
+    for table, column, declaration in COLUMNS:
+        add_column(conn, table, column, declaration)
+    init_indexes(conn)
@@ -0,0 +1,249 @@
+"""Batch judge harness, copied into the sandbox folder and run inside the container.
+
+    python3 /app/harness.py /app/temp_<submission_id>.py '<limits json>' < cases
+
+stdin holds one JSON argument list per line, or an object with "args" or
+"args_file" (a large input on the read-only /data mount, mapped with mmap).
+Expected values never reach the sandbox; the judge compares them, and runs
+custom checkers, on the host. The user module is loaded once and
+`solution(*args)` is called for every case; one JSON line is written per case as
+soon as it finishes, so the judge can stop reading at the first failing case.
+
+stdout is the result channel and carries nothing but those lines: the harness
+keeps a private copy of it and points fd 1 at stderr, so output that escapes
+the per-case capture (os.write, child processes) ends up on stderr instead.
+
+Limits are enforced per case in here, so container startup and machine load
+don't count against the user: "cpu" and "wall" seconds (ITIMER_PROF/ITIMER_REAL),
+"memory" MB on top of the harness's own address space (RLIMIT_AS), "pids"
+(RLIMIT_NPROC, which needs the container's own non-root uid; see
+sandbox.docker_run_args) and "output" KB of printed text; printed text past the limit is
+cut off with TRUNCATION_MARKER. Each case reports its CPU time in ms as
+"runtime" and its peak RSS in KB as "memory".
+"""
+import contextlib
+import io
+import json
+import mmap
+import os
+import resource
+import signal
+import sys
+import traceback
+
+INCOMPLETE_CODE_MESSAGE = "Please use 'return' to properly testcase your code"
+TRUNCATION_MARKER = "\n... [output truncated]"
+NOT_SERIALIZABLE_MESSAGE = "TypeError: return value is not JSON serializable"
+
+
+def format_error(e, path, source_lines):
+    if isinstance(e, SyntaxError):
+        # an empty function body at the end of the file is the unfinished starter code
+        if isinstance(e, IndentationError) and (e.lineno or 0) >= len(source_lines):
+            return INCOMPLETE_CODE_MESSAGE
+        text = (e.text or "").rstrip()
+        return f"line {e.lineno}\n    {text.strip()}\n{type(e).__name__}: {e.msg}"
+
+    lines = []
+    for frame in traceback.extract_tb(e.__traceback__):
+        if frame.filename != path:
+            continue
+        lines.append(f"line {frame.lineno}, in {frame.name}")
+        if frame.line:
+            lines.append(f"    {frame.line}")
+    lines.extend(line.rstrip("\n") for line in traceback.format_exception_only(type(e), e))
+    return "\n".join(lines)
+
+
+class LimitExceeded(BaseException):
+    # BaseException so user code catching Exception can't swallow it
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.kind = kind
+
+
+def on_timer(signum, frame):
+    raise LimitExceeded("time")
+
+
+class CappedOutput(io.StringIO):
+    # keeps at most `limit` characters; the write that goes past it stops the case
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+
+    def write(self, text):
+        if self.limit and self.size + len(text) > self.limit:
+            super().write(text[:self.limit - self.size])
+            self.size = self.limit
+            raise LimitExceeded("output")
+        self.size += len(text)
+        return super().write(text)
+
+
+def proc_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # "5" resets VmHWM so every case reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    peak = proc_status_kb("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def apply_limits(limits):
+    signal.signal(signal.SIGPROF, on_timer)
+    signal.signal(signal.SIGALRM, on_timer)
+    if limits.get("memory"):
+        base = (proc_status_kb("VmSize") or 0) * 1024
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (base + limits["memory"] * 1024 * 1024, hard))
+    if limits.get("pids"):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NPROC)
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits["pids"], hard))
+    if limits.get("output"):
+        # files written by user code count too; EFBIG instead of being killed
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+        soft, hard = resource.getrlimit(resource.RLIMIT_FSIZE)
+        resource.setrlimit(resource.RLIMIT_FSIZE, (limits["output"] * 1024, hard))
+
+
+@contextlib.contextmanager
+def case_timers(limits):
+    signal.setitimer(signal.ITIMER_PROF, limits.get("cpu") or 0)
+    signal.setitimer(signal.ITIMER_REAL, limits.get("wall") or 0)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def limit_kind(e):
+    if isinstance(e, LimitExceeded):
+        return e.kind
+    if isinstance(e, MemoryError):
+        return "memory"
+    return None
+
+
+def load_solution(path):
+    with open(path) as f:
+        source = f.read()
+    module = {"__name__": "solution", "__file__": path}
+    try:
+        exec(compile(source, path, "exec"), module)
+        return module["solution"], source.splitlines()
+    except KeyError:
+        raise NameError("name 'solution' is not defined") from None
+
+
+def result_channel():
+    """File for result lines on the original stdout; fd 1 is pointed at stderr."""
+    sys.stdout.flush()
+    # os.dup() is not inherited, so child processes of the user code can't write results
+    out = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    return out
+
+
+def read_json_file(path):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return json.loads(data[:])
+
+
+def case_args(line):
+    """The argument list of one stdin line."""
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        return data
+    return read_json_file(data["args_file"]) if "args_file" in data else data["args"]
+
+
+def main():
+    path = sys.argv[1]
+    limits = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+    output_limit = (limits.get("output") or 0) * 1024
+    cases = [line for line in sys.stdin.read().splitlines() if line.strip()]
+    out = result_channel()
+
+    def emit(result):
+        try:
+            line = json.dumps(result)
+        except (TypeError, ValueError, RecursionError):
+            # a set, bytes, object or cyclic value came back; the case fails, the rest still run
+            error = {"case": result["case"], "error": NOT_SERIALIZABLE_MESSAGE}
+            line = json.dumps(dict(error, runtime=result.get("runtime"), memory=result.get("memory")))
+        out.write(line + "\n")
+        out.flush()
+
+    def measured(result, cpu_start):
+        result["runtime"] = round((cpu_seconds() - cpu_start) * 1000, 1)
+        result["memory"] = peak_rss_kb()
+        return result
+
+    def failure(index, e, cpu_start, buf=None):
+        kind = limit_kind(e)
+        if kind == "output" and buf is not None:
+            printed = buf.getvalue() + TRUNCATION_MARKER
+            return measured({"case": index, "limit": kind, "printed": printed}, cpu_start)
+        if kind is not None:
+            return measured({"case": index, "limit": kind}, cpu_start)
+        return measured({"case": index, "error": format_error(e, path, source_lines)}, cpu_start)
+
+    apply_limits(limits)
+    cpu_start = cpu_seconds()
+    source_lines = []
+    try:
+        with open(path) as f:
+            source_lines = f.read().splitlines()
+        with CappedOutput(output_limit) as buf, contextlib.redirect_stdout(buf), case_timers(limits):
+            solution, source_lines = load_solution(path)
+    except BaseException as e:
+        # nothing can run without the module: every case fails the same way
+        result = failure(0, e, cpu_start)
+        for index in range(max(len(cases), 1)):
+            emit(dict(result, case=index))
+        return
+
+    for index, line in enumerate(cases):
+        reset_peak_rss()
+        cpu_start = cpu_seconds()
+        buf = CappedOutput(output_limit)
+        try:
+            args = case_args(line)
+            # reading a large input isn't the user's time
+            cpu_start = cpu_seconds()
+            with contextlib.redirect_stdout(buf):
+                with case_timers(limits):
+                    returned_value = solution(*args)
+            result = measured({"case": index, "return": returned_value, "printed": buf.getvalue()}, cpu_start)
+        except BaseException as e:
+            emit(failure(index, e, cpu_start, buf))
+            continue
+        emit(result)
+
+
+if __name__ == "__main__":
+    main()
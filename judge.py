@@ -0,0 +1,587 @@
+"""Judge workers: lease submissions from the shared job queue and run them in the sandbox.
+
+The web app starts these as threads when JUDGE_IN_PROCESS is on. To scale out,
+run this file on its own, as many times and on as many hosts as needed:
+
+    python judge.py --min-workers 1 --max-workers 4 --metrics-port 9101
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import queue
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+import psutil
+
+import checkers
+import metrics
+import testdata
+import verdict_cache
+from cache import TTLCache
+from db import get_db_connection, init_schema, release_connection
+from judge_queue import JOB_RESULT_RETENTION, VISIBILITY_TIMEOUT, make_job_queue, worker_name
+from result_store import save_result
+from sandbox import (SANDBOX_DIR, WALL_GRACE, CONTAINERS_PER_WORKER, ContainerPool, ColdSandbox, Lease,
+                     case_limits, install_harness, harness_cmd, stream_cases)
+
+# ---------------------- Worker Settings ----------------------
+# the judge pool scales between these bounds (see JudgePool)
+MIN_WORKERS = int(os.environ.get("JUDGE_MIN_WORKERS", 1))
+MAX_WORKERS = int(os.environ.get("JUDGE_MAX_WORKERS", os.cpu_count() or 2))
+POLL_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 5
+PURGE_EVERY = 12
+
+# Set to False to fall back to one `docker run --rm` per submission
+USE_CONTAINER_POOL = True
+container_pool = None
+
+
+def sandbox_lease():
+    if USE_CONTAINER_POOL:
+        return Lease(container_pool)
+    return nullcontext(ColdSandbox())
+
+
+# ---------------------- Workers ----------------------
+def worker(job_queue, worker_id, stop):
+    while not stop.is_set():
+        try:
+            job = next_job(job_queue, worker_id, stop)
+        except sqlite3.Error as e:
+            # a busy or unreachable queue DB must not kill the worker thread
+            print(f"Judge worker {worker_id} could not lease a job: {e}")
+            time.sleep(POLL_INTERVAL)
+            continue
+        if job is None:
+            break
+
+        submission_id = job["id"]
+        leased_at = time.time()
+        metrics.stage_seconds.observe(leased_at - job["enqueued_at"], stage="enqueue_wait")
+        try:
+            job_queue.set_worker_status(worker_id, "busy", submission_id)
+
+            # every finished test case is pushed to the editor over /result/<id>/stream
+            def on_case(index, entry):
+                job_queue.publish(submission_id, "case", dict(entry, index=index))
+
+            with sandbox_lease() as box:
+                metrics.stage_seconds.observe(time.time() - leased_at, stage="sandbox_wait")
+                result = run_submission(job["code"], job["problem_id"], submission_id, job["user_id"], box, on_case,
+                                        job.get("mode", "submit"))
+            job_queue.complete(submission_id, worker_id, result)
+            metrics.stage_seconds.observe(time.time() - leased_at, stage="total")
+        except Exception as e:
+            # roll back whatever the failed run left open before reporting it
+            release_connection()
+            try:
+                # the job goes back on the queue and is retried until MAX_ATTEMPTS
+                job_queue.fail(submission_id, worker_id, str(e))
+            except sqlite3.Error as e:
+                print(f"Judge worker {worker_id} could not report failure of {submission_id}: {e}")
+        finally:
+            release_connection()
+
+    try:
+        job_queue.remove_worker(worker_id)
+    except sqlite3.Error:
+        pass
+    finally:
+        release_connection()
+
+
+def next_job(job_queue, worker_id, stop):
+    """Lease the next job, waiting for one; None once `stop` is set."""
+    job_queue.set_worker_status(worker_id, "idle")
+    job = job_queue.lease(worker_id)
+    while job is None:
+        if stop.is_set():
+            return None
+        job_queue.wakeup.wait(POLL_INTERVAL)
+        job_queue.wakeup.clear()
+        job = job_queue.lease(worker_id)
+    return job
+
+
+def heartbeat(job_queue, judge_pool):
+    beats = 0
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        beats += 1
+        worker_ids = judge_pool.worker_ids()
+        try:
+            job_queue.heartbeat(worker_ids)
+            for worker_id in worker_ids:
+                job_queue.extend(worker_id, VISIBILITY_TIMEOUT)
+            if beats % PURGE_EVERY == 0:
+                job_queue.purge_finished(JOB_RESULT_RETENTION)
+        except sqlite3.Error as e:
+            print(f"Judge heartbeat failed: {e}")
+        finally:
+            release_connection()
+
+
+def start_workers(job_queue, min_workers=MIN_WORKERS, max_workers=MAX_WORKERS):
+    global container_pool
+
+    try:
+        install_harness()
+    except OSError as e:
+        print(f"Could not copy harness.py into {SANDBOX_DIR}: {e}")
+    # docker would create a missing mount source as root
+    os.makedirs(testdata.INPUTS_DIR, exist_ok=True)
+
+    conn = get_db_connection()
+    init_schema(conn)
+    verdict_cache.init_verdict_cache(conn)
+    conn.close()
+
+    if USE_CONTAINER_POOL:
+        container_pool = ContainerPool(min_workers * CONTAINERS_PER_WORKER)
+        threading.Thread(target=container_pool.start, daemon=True).start()
+
+    judge_pool = JudgePool(job_queue, min_workers, max_workers)
+    judge_pool.add(min_workers)
+    threading.Thread(target=heartbeat, args=(job_queue, judge_pool), daemon=True).start()
+    if judge_pool.max_workers > judge_pool.min_workers:
+        threading.Thread(target=judge_pool.run, daemon=True).start()
+    return judge_pool
+
+
+# ---------------------- Autoscaling ----------------------
+# Worker threads are added while jobs wait longer than TARGET_WAIT and the host
+# has CPU and memory to spare, and removed again after SCALE_DOWN_AFTER checks
+# in a row with an empty queue. The container pool follows the worker count.
+SCALE_INTERVAL = 2
+SCALE_UP_STEP = 2
+SCALE_DOWN_AFTER = 5
+TARGET_WAIT = 2
+CPU_HIGH = 85
+MEM_HIGH = 90
+
+
+class JudgePool:
+    def __init__(self, job_queue, min_workers=MIN_WORKERS, max_workers=MAX_WORKERS):
+        self.job_queue = job_queue
+        self.min_workers = min_workers
+        self.max_workers = max(min_workers, max_workers)
+        self.stops = {}
+        self.next_index = 0
+        self.quiet_checks = 0
+        self.lock = threading.Lock()
+
+    def worker_ids(self):
+        with self.lock:
+            return list(self.stops)
+
+    def size(self):
+        return len(self.stops)
+
+    def add(self, count=1):
+        with self.lock:
+            for _ in range(count):
+                worker_id = worker_name(self.next_index)
+                self.next_index += 1
+                self.stops[worker_id] = threading.Event()
+                threading.Thread(target=worker, args=(self.job_queue, worker_id, self.stops[worker_id]),
+                                 daemon=True).start()
+            size = len(self.stops)
+        if container_pool is not None:
+            container_pool.resize(size * CONTAINERS_PER_WORKER)
+
+    def remove(self, count=1):
+        # the newest workers stop once their current job is done
+        with self.lock:
+            for worker_id in list(self.stops)[-count:]:
+                if len(self.stops) <= self.min_workers:
+                    break
+                self.stops.pop(worker_id).set()
+            size = len(self.stops)
+        if container_pool is not None:
+            container_pool.resize(size * CONTAINERS_PER_WORKER)
+
+    def scale_once(self):
+        load = self.job_queue.load()
+        saturated = psutil.cpu_percent(interval=None) >= CPU_HIGH or psutil.virtual_memory().percent >= MEM_HIGH
+        size = self.size()
+        if load["depth"] and load["oldest_wait"] > TARGET_WAIT and not saturated and size < self.max_workers:
+            # enough workers to work off the backlog within TARGET_WAIT at the recent run time
+            wanted = math.ceil(load["depth"] * (load["avg_run"] or 1.0) / TARGET_WAIT)
+            self.add(max(1, min(SCALE_UP_STEP, wanted - size, self.max_workers - size)))
+            self.quiet_checks = 0
+        elif load["depth"] == 0 and size > self.min_workers:
+            self.quiet_checks += 1
+            if self.quiet_checks >= SCALE_DOWN_AFTER:
+                self.remove(1)
+                self.quiet_checks = 0
+        else:
+            self.quiet_checks = 0
+
+    def run(self):
+        psutil.cpu_percent(interval=None)
+        while True:
+            time.sleep(SCALE_INTERVAL)
+            try:
+                self.scale_once()
+            except sqlite3.Error as e:
+                print(f"Judge autoscaler could not read the queue: {e}")
+            finally:
+                release_connection()
+
+    def stop_all(self):
+        with self.lock:
+            for stop in self.stops.values():
+                stop.set()
+            self.stops = {}
+
+
+# ---------------------- Admission ----------------------
+# /run turns submissions away (HTTP 503 + Retry-After) instead of letting the queue grow without bound
+MAX_QUEUE_DEPTH = 500
+MAX_QUEUE_WAIT = 60
+ADMISSION_CHECK_TTL = 1
+admission_cache = TTLCache(maxsize=1, ttl=ADMISSION_CHECK_TTL)
+
+
+def admission_delay(job_queue, cpu=None):
+    """None if a new submission may be queued, else the seconds the client should wait before retrying.
+
+    `cpu` is the latest system CPU % from a background sampler (None = unknown); request
+    threads don't call psutil.cpu_percent() themselves, their "since last call" is meaningless.
+    """
+    delay = admission_cache.get("delay", "unset")
+    if delay != "unset":
+        return delay
+    load = job_queue.load()
+    workers = load["workers"] or 1
+    expected_wait = load["depth"] * (load["avg_run"] or 1.0) / workers
+    saturated = cpu is not None and cpu >= CPU_HIGH and load["depth"] >= workers
+    delay = None
+    if load["depth"] >= MAX_QUEUE_DEPTH or expected_wait > MAX_QUEUE_WAIT or saturated:
+        delay = max(1, math.ceil(min(expected_wait, MAX_QUEUE_WAIT)))
+    admission_cache.set("delay", delay)
+    return delay
+
+
+# ---------------------- Run Submission Logic ----------------------
+def run_submission(user_code, problem_id, submission_id, user_id, box, on_case=None, mode="submit"):
+    conn = get_db_connection()
+    with metrics.stage_seconds.time(stage="test_case_fetch"):
+        problem = conn.execute(
+            "SELECT * FROM problems WHERE id=?", (problem_id,)
+        ).fetchone()
+        test_cases = conn.execute(
+            "SELECT input, expected, input_ref, input_size, expected_ref, expected_size "
+            "FROM test_cases WHERE problem_id=? ORDER BY id", (problem_id,)
+        ).fetchall()
+    policy = execution_policy(problem, mode)
+    fingerprint = verdict_cache.test_fingerprint(test_cases)
+    key = verdict_key(mode, policy, problem_id, user_code, test_cases, fingerprint)
+    cached = verdict_cache.lookup(conn, key)
+    conn.close()
+
+    results = []
+
+    def add_result(entry):
+        results.append(entry)
+        if on_case is not None:
+            on_case(len(results) - 1, entry)
+
+    if cached is not None:
+        # byte-identical (normalized) code was already judged against these exact test cases
+        for entry in cached["results"]:
+            add_result(entry)
+        with metrics.stage_seconds.time(stage="db_persist"):
+            save_result(submission_id, user_id, cached["status"], cached["memory"], cached["runtime"], results,
+                        cache_key=key, cache_hit=True, mode=mode)
+        return results
+
+    cases = checkers.prepare_cases(test_cases, policy["checker"], fingerprint)
+    status, memory, runtime, error = judge_cases(user_code, cases, submission_id, box, add_result, policy)
+    with metrics.stage_seconds.time(stage="db_persist"):
+        save_result(submission_id, user_id, status, memory, runtime, results, error,
+                    problem_id=problem_id, cache_key=key, mode=mode)
+    return results
+
+
+# ---------------------- Execution Policy ----------------------
+# "submit" stops at the first failing case, "run" reports every case
+RUN_MODES = ("submit", "run")
+# wall-clock budget for all cases of one submission, unless the problem sets its own
+TOTAL_TIME_LIMIT = 30
+# a parallel problem borrows up to this many extra idle sandboxes...
+PARALLEL_EXTRA_SLOTS = 3
+# ...but only as many as keep at least this many cases per sandbox
+MIN_CASES_PER_SLOT = 2
+
+STATUS_BY_VERDICT = {"wrong": "wrong", "Error": "Error", "Memory Limit": "Memory Limit",
+                     "Time Limit Exceeded": "Time Limit", "Output Limit Exceeded": "Output Limit"}
+VERDICT_BY_LIMIT = {"time": "Time Limit Exceeded", "memory": "Memory Limit", "output": "Output Limit Exceeded"}
+
+
+def execution_policy(problem, mode):
+    return {
+        "stop_on_failure": mode != "run",
+        "parallel": problem is not None and problem["exec_policy"] == "parallel",
+        "total_time_limit": (problem["total_time_limit"] if problem and problem["total_time_limit"]
+                             else TOTAL_TIME_LIMIT),
+        "limits": case_limits(problem),
+        "checker": checkers.checker_config(problem),
+    }
+
+
+def limits_id(policy):
+    """Short hash of everything in the policy that can turn a passing run into a limit verdict."""
+    limits = [sorted(policy["limits"].items()), policy["total_time_limit"], policy["parallel"]]
+    return hashlib.sha256(json.dumps(limits).encode()).hexdigest()[:12]
+
+
+def verdict_key(mode, policy, problem_id, user_code, test_cases, fingerprint=None):
+    # verdicts depend on the checker and the limits too, so changing them never replays an old one
+    return f"{mode}:{policy['checker']['id']}:{limits_id(policy)}:" + verdict_cache.cache_key(
+        problem_id, user_code, test_cases, fingerprint)
+
+
+def borrow_boxes(count):
+    if count <= 0:
+        return []
+    if USE_CONTAINER_POOL:
+        boxes = [container_pool.try_lease() for _ in range(count)]
+        return [b for b in boxes if b is not None]
+    return [ColdSandbox() for _ in range(count)]
+
+
+def return_boxes(boxes):
+    # resetting a container takes a docker exec; don't make the submission wait for it
+    if USE_CONTAINER_POOL and boxes:
+        threading.Thread(target=lambda: [container_pool.release(b) for b in boxes], daemon=True).start()
+
+
+def case_outputs(boxes, cmd, inputs, timeout, deadline, cancel):
+    """Yield (case index, harness output) in the order cases finish.
+
+    Cases are dealt round-robin over `boxes`, one harness process per box. A case
+    that runs out of time yields {"timeout": True}; nothing more comes from that box.
+    """
+    if len(boxes) == 1:
+        index = 0
+        stream = stream_cases(boxes[0], cmd, inputs, timeout=timeout, deadline=deadline, cancel=cancel)
+        try:
+            for output_json in stream:
+                yield index, output_json
+                index += 1
+        except subprocess.TimeoutExpired:
+            yield index, {"timeout": True}
+        finally:
+            stream.close()
+        return
+
+    chunks = [list(range(i, len(inputs), len(boxes))) for i in range(len(boxes))]
+    outputs = queue.Queue()
+
+    def run_chunk(chunk_box, chunk):
+        position = 0
+        try:
+            for output_json in stream_cases(chunk_box, cmd, [inputs[i] for i in chunk], timeout=timeout,
+                                            deadline=deadline, cancel=cancel):
+                if position < len(chunk):
+                    outputs.put((chunk[position], output_json))
+                position += 1
+        except subprocess.TimeoutExpired:
+            # a timeout after every case answered (the exit record, the last read) is dropped
+            if position < len(chunk):
+                outputs.put((chunk[position], {"timeout": True}))
+        except Exception as e:
+            if position < len(chunk):
+                outputs.put((chunk[position], {"error": f"Sandbox failure: {e}"}))
+        finally:
+            outputs.put(None)
+
+    threads = [threading.Thread(target=run_chunk, args=(b, c), daemon=True) for b, c in zip(boxes, chunks)]
+    for t in threads:
+        t.start()
+    running = len(threads)
+    try:
+        while running:
+            item = outputs.get()
+            if item is None:
+                running -= 1
+            else:
+                yield item
+    finally:
+        if running:
+            # the caller stopped early: stop the sandboxes still going
+            cancel.set()
+        for t in threads:
+            t.join()
+
+
+def judge_cases(user_code, cases, submission_id, box, add_result, policy):
+    """Run the test cases (checkers.prepare_cases) through the harness under `policy`,
+    reporting each through add_result.
+
+    Cases are reported in test case order even when they finish out of order. With
+    stop_on_failure, nothing after the first failing case is run or reported.
+    Returns (status, memory, runtime, error) for the submissions row.
+    """
+    temp_file = os.path.join(SANDBOX_DIR, f"temp_{submission_id}.py")
+
+    # user code is loaded once by the batch harness (harness.py) for every test case
+    checker = policy["checker"]
+    with metrics.stage_seconds.time(stage="file_write"):
+        with open(temp_file, "w") as f:
+            f.write(user_code)
+
+    inputs = [case["line"] for case in cases]
+    boxes = [box]
+    if policy["parallel"]:
+        boxes += borrow_boxes(min(PARALLEL_EXTRA_SLOTS, len(inputs) // MIN_CASES_PER_SLOT - 1))
+    deadline = time.monotonic() + policy["total_time_limit"]
+    cancel = threading.Event()
+
+    summary = {"status": "correct", "memory": 0, "runtime": 0.0, "error": None}
+
+    def report(entry):
+        summary["memory"] = max(summary["memory"], entry.pop("memory", 0) or 0)
+        summary["runtime"] = max(summary["runtime"], entry.pop("runtime", 0) or 0)
+        add_result(entry)
+        # the first failing case decides the status
+        if entry["verdict"] != "correct" and summary["status"] == "correct":
+            summary["status"] = STATUS_BY_VERDICT[entry["verdict"]]
+            if entry["verdict"] == "Error":
+                summary["error"] = f'RunTime Error:\n{entry["error"]}'
+            if policy["stop_on_failure"]:
+                cancel.set()
+
+    finished = {}
+    reported = 0
+    parse_seconds = 0.0
+    started = time.perf_counter()
+    # the harness enforces the per-case limits; the host only waits for a hung or dead sandbox
+    limits = policy["limits"]
+    cmd = harness_cmd(os.path.basename(temp_file), limits)
+    outputs = case_outputs(boxes, cmd, inputs, limits["wall"] + WALL_GRACE, deadline, cancel)
+    try:
+        for index, output_json in outputs:
+            if index >= len(cases):
+                continue
+            parse_start = time.perf_counter()
+            finished[index] = case_result(cases[index], output_json, checker)
+            parse_seconds += time.perf_counter() - parse_start
+            # report in test case order
+            while reported in finished and not cancel.is_set():
+                report(finished.pop(reported))
+                reported += 1
+            if cancel.is_set():
+                break
+    finally:
+        outputs.close()
+        metrics.stage_seconds.observe(time.perf_counter() - started - parse_seconds, stage="execution")
+        metrics.stage_seconds.observe(parse_seconds, stage="parse")
+        return_boxes(boxes[1:])
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+    if not cancel.is_set():
+        # cases behind one that never answered (its sandbox died) still get reported
+        for index in sorted(finished):
+            report(finished[index])
+
+    # CPU ms and peak RSS KB of the most expensive case
+    return summary["status"], summary["memory"], summary["runtime"], summary["error"]
+
+
+def case_result(case, output_json, checker):
+    entry = {
+        "input": case["input"],
+        "expected": case["expected"],
+        "output": None,
+        "printed": "",
+        "verdict": "",
+        "error": ""
+    }
+    if output_json.get("timeout"):
+        return dict(entry, output="", verdict="Time Limit Exceeded")
+
+    # Memory Limit Error
+    if output_json.get("exit") == 137:
+        return dict(entry, verdict="Memory Limit")
+
+    # harness died without answering this case (e.g. os._exit in user code)
+    if "exit" in output_json:
+        output_json = {"error": output_json["output"].strip() or "No JSON output"}
+
+    # measured inside the sandbox: CPU ms and peak RSS KB
+    entry.update(memory=output_json.get("memory"), runtime=output_json.get("runtime"))
+
+    if "limit" in output_json:
+        # an output limit keeps what was printed up to the cap, ending in a truncation marker
+        return dict(entry, output="", printed=output_json.get("printed", ""),
+                    verdict=VERDICT_BY_LIMIT[output_json["limit"]])
+
+    if "error" in output_json:
+        return dict(entry, verdict="Error", error=output_json["error"])
+
+    returned_value = output_json.get("return")
+    entry.update(output=returned_value, printed=output_json.get("printed", ""))
+    if checker["name"] == "custom":
+        # run here rather than in the sandbox, where user code could read or forge it
+        answer = checkers.run_custom(checker, case, returned_value)
+        if answer.get("failed"):
+            return dict(entry, verdict="Error", error=answer["message"])
+        if answer["ok"]:
+            return dict(entry, verdict="correct")
+        return dict(entry, verdict="wrong", error=answer["message"])
+    if checkers.check(checker, returned_value, case["prepared"]):
+        if case["expected_file"]:
+            # a file-backed expected value: store its label instead of a second copy of the data
+            entry["output"] = case["expected"]
+        return dict(entry, verdict="correct")
+    return dict(entry, verdict="wrong")
+
+
+# ---------------------- Main ----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Run judge workers against the shared submission queue.")
+    parser.add_argument("--min-workers", type=int, default=MIN_WORKERS, help="worker threads kept running")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="worker threads added under load")
+    parser.add_argument("--workers", type=int, help="fixed number of worker threads (no autoscaling)")
+    parser.add_argument("--metrics-port", type=int, help="serve latency histograms on this port")
+    args = parser.parse_args()
+    if args.workers:
+        args.min_workers = args.max_workers = args.workers
+
+    # let `docker stop` / systemd shut the judge down cleanly
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    job_queue = make_job_queue()
+    judge_pool = start_workers(job_queue, args.min_workers, args.max_workers)
+    print(f"Judge started with {judge_pool.min_workers}-{judge_pool.max_workers} workers")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker_ids = judge_pool.worker_ids()
+        judge_pool.stop_all()
+        for worker_id in worker_ids:
+            job_queue.remove_worker(worker_id)
+        if container_pool is not None:
+            container_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
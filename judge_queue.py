@@ -0,0 +1,499 @@
+import json
+import os
+import socket
+import threading
+import time
+
+from db import add_column, get_db_connection
+
+# ---------------------- Queue Settings ----------------------
+VISIBILITY_TIMEOUT = 60
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 2
+WORKER_STALE_AFTER = 15
+# finished jobs keep their result payload this long; after that /result reads submissions/testcaseSub
+JOB_RESULT_RETENTION = 600
+# recent jobs whose run time feeds load()
+LOAD_WINDOW = 300
+
+# ---------------------- Scheduling ----------------------
+# Jobs are leased by priority class first (lower runs first), then round-robin
+# over users: a job's user_round is how many jobs of the same user and class
+# were already waiting or running when it was queued, so everyone's first job
+# goes before anyone's second. A user never has more than
+# MAX_IN_FLIGHT_PER_USER jobs running at once while others wait.
+PRIORITY_CLASSES = {"contest": 0, "submit": 1, "run": 2}
+MAX_IN_FLIGHT_PER_USER = 2
+
+
+def job_class(mode, contest=False):
+    """Priority class of a submission: contest submit > practice submit > sample run."""
+    if mode == "submit" and contest:
+        return "contest"
+    return mode if mode in PRIORITY_CLASSES else "submit"
+
+
+def worker_name(index):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def init_queue_schema(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS judge_jobs (
+        id TEXT PRIMARY KEY,
+        problem_id INTEGER NOT NULL,
+        user_id INTEGER,
+        code TEXT NOT NULL,
+        mode TEXT NOT NULL DEFAULT 'submit',
+        job_class TEXT NOT NULL DEFAULT 'submit',
+        priority INTEGER NOT NULL DEFAULT 1,
+        user_round INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires REAL,
+        available_at REAL NOT NULL,
+        enqueued_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        result TEXT,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_judge_jobs_status ON judge_jobs (status, available_at);
+    CREATE TABLE IF NOT EXISTS judge_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_judge_events_job ON judge_events (job_id, id);
+    CREATE TABLE IF NOT EXISTS judge_workers (
+        id TEXT PRIMARY KEY,
+        host TEXT,
+        pid INTEGER,
+        status TEXT,
+        submission_id TEXT,
+        heartbeat REAL
+    );
+    """)
+    add_column(conn, "judge_jobs", "mode", "TEXT NOT NULL DEFAULT 'submit'")
+    add_column(conn, "judge_jobs", "started_at", "REAL")
+    add_column(conn, "judge_jobs", "job_class", "TEXT NOT NULL DEFAULT 'submit'")
+    add_column(conn, "judge_jobs", "priority", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "judge_jobs", "user_round", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_judge_jobs_schedule "
+        "ON judge_jobs (status, priority, user_round, enqueued_at)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_judge_jobs_user ON judge_jobs (user_id, status)")
+    conn.commit()
+
+
+# ---------------------- SQLite Job Queue ----------------------
+class SQLiteJobQueue:
+    """Durable judge queue shared by the web app and every judge process through the DB.
+
+    A worker leases a job for VISIBILITY_TIMEOUT seconds. If it does not finish or
+    extend the lease in time (crash, restart, lost host) the job becomes visible
+    again and is retried, up to MAX_ATTEMPTS before it is marked dead.
+    """
+
+    def __init__(self, connect=get_db_connection):
+        self.connect = connect
+        self.wakeup = threading.Event()
+        self.changed = threading.Condition()
+        conn = self.connect()
+        init_queue_schema(conn)
+        conn.close()
+
+    def enqueue(self, submission_id, code, problem_id, user_id, mode="submit", klass=None):
+        klass = klass or job_class(mode)
+        now = time.time()
+        conn = self.connect()
+        conn.execute(
+            "INSERT INTO judge_jobs (id, problem_id, user_id, code, mode, job_class, priority, user_round, "
+            "available_at, enqueued_at) "
+            "SELECT ?, ?, ?, ?, ?, ?, ?, COUNT(*), ?, ? FROM judge_jobs "
+            "WHERE user_id IS ? AND job_class = ? AND status IN ('queued', 'running')",
+            (submission_id, problem_id, user_id, code, mode, klass, PRIORITY_CLASSES[klass], now, now,
+             user_id, klass)
+        )
+        conn.commit()
+        conn.close()
+        self.wakeup.set()
+
+    def lease(self, owner, lease_seconds=VISIBILITY_TIMEOUT):
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # jobs whose lease ran out too many times are given up on
+            conn.execute(
+                "UPDATE judge_jobs SET status='dead', finished_at=?, error=IFNULL(error, 'Judge worker stopped responding') "
+                "WHERE status='running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, MAX_ATTEMPTS)
+            )
+            # a job whose lease ran out is retried before anything new
+            job = conn.execute(
+                "SELECT * FROM judge_jobs WHERE status='running' AND lease_expires < ? "
+                "ORDER BY priority, enqueued_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if job is None:
+                job = conn.execute(
+                    "SELECT * FROM judge_jobs "
+                    "WHERE status='queued' AND available_at <= ? AND IFNULL(user_id, '') NOT IN ("
+                    "  SELECT IFNULL(user_id, '') FROM judge_jobs WHERE status='running' "
+                    "  GROUP BY user_id HAVING COUNT(*) >= ?) "
+                    "ORDER BY priority, user_round, enqueued_at LIMIT 1",
+                    (now, MAX_IN_FLIGHT_PER_USER)
+                ).fetchone()
+            if job is None:
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE judge_jobs SET status='running', lease_owner=?, lease_expires=?, started_at=?, "
+                "attempts=attempts+1 WHERE id=?",
+                (owner, now + lease_seconds, now, job["id"])
+            )
+            conn.commit()
+            return dict(job)
+        finally:
+            conn.close()
+
+    def extend(self, owner, lease_seconds=VISIBILITY_TIMEOUT):
+        conn = self.connect()
+        conn.execute(
+            "UPDATE judge_jobs SET lease_expires=? WHERE status='running' AND lease_owner=?",
+            (time.time() + lease_seconds, owner)
+        )
+        conn.commit()
+        conn.close()
+
+    def complete(self, job_id, owner, result):
+        conn = self.connect()
+        conn.execute(
+            "UPDATE judge_jobs SET status='done', result=?, finished_at=?, lease_owner=NULL "
+            "WHERE id=? AND lease_owner=?",
+            (json.dumps(result), time.time(), job_id, owner)
+        )
+        conn.execute("DELETE FROM judge_events WHERE job_id=?", (job_id,))
+        conn.commit()
+        conn.close()
+        self.notify()
+
+    def fail(self, job_id, owner, error):
+        now = time.time()
+        conn = self.connect()
+        job = conn.execute("SELECT attempts FROM judge_jobs WHERE id=? AND lease_owner=?", (job_id, owner)).fetchone()
+        if job is not None:
+            if job["attempts"] >= MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE judge_jobs SET status='dead', error=?, finished_at=?, lease_owner=NULL WHERE id=?",
+                    (error, now, job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE judge_jobs SET status='queued', error=?, available_at=?, lease_owner=NULL WHERE id=?",
+                    (error, now + RETRY_DELAY * job["attempts"], job_id)
+                )
+            # a retry starts reporting its cases from scratch
+            conn.execute("DELETE FROM judge_events WHERE job_id=?", (job_id,))
+            conn.commit()
+        conn.close()
+        self.notify()
+
+    # ---------------- progress events ----------------
+    def publish(self, job_id, kind, payload):
+        conn = self.connect()
+        conn.execute("INSERT INTO judge_events (job_id, kind, payload) VALUES (?, ?, ?)",
+                     (job_id, kind, json.dumps(payload)))
+        conn.commit()
+        conn.close()
+        self.notify()
+
+    def events_since(self, job_id, after_id=0):
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT id, kind, payload FROM judge_events WHERE job_id=? AND id>? ORDER BY id",
+            (job_id, after_id)
+        ).fetchall()
+        conn.close()
+        return [(r["id"], r["kind"], json.loads(r["payload"])) for r in rows]
+
+    def notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def wait_for_events(self, timeout):
+        # only wakes early for judges in this process; others are picked up on the next poll
+        with self.changed:
+            self.changed.wait(timeout)
+
+    def get(self, job_id):
+        conn = self.connect()
+        job = conn.execute("SELECT id, status, result, error FROM judge_jobs WHERE id=?", (job_id,)).fetchone()
+        conn.close()
+        return dict(job) if job else None
+
+    def purge_finished(self, older_than=JOB_RESULT_RETENTION):
+        conn = self.connect()
+        cur = conn.execute("DELETE FROM judge_jobs WHERE status IN ('done', 'dead') AND finished_at < ?",
+                           (time.time() - older_than,))
+        conn.commit()
+        conn.close()
+        return cur.rowcount
+
+    def depth(self):
+        conn = self.connect()
+        row = conn.execute("SELECT COUNT(*) AS cnt FROM judge_jobs WHERE status='queued'").fetchone()
+        conn.close()
+        return row["cnt"]
+
+    def class_depths(self):
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT job_class, COUNT(*) AS cnt FROM judge_jobs WHERE status='queued' GROUP BY job_class"
+        ).fetchall()
+        conn.close()
+        depths = dict.fromkeys(PRIORITY_CLASSES, 0)
+        depths.update({r["job_class"]: r["cnt"] for r in rows})
+        return depths
+
+    def load(self, window=LOAD_WINDOW):
+        """Queue pressure: queued jobs, seconds the oldest has waited, mean run time of
+        recent jobs and live workers."""
+        now = time.time()
+        conn = self.connect()
+        queued = conn.execute(
+            "SELECT COUNT(*) AS cnt, MIN(enqueued_at) AS oldest FROM judge_jobs WHERE status='queued'"
+        ).fetchone()
+        ran = conn.execute(
+            "SELECT AVG(finished_at - started_at) AS avg_run FROM judge_jobs "
+            "WHERE status='done' AND finished_at > ? AND started_at IS NOT NULL",
+            (now - window,)
+        ).fetchone()
+        workers = conn.execute(
+            "SELECT COUNT(*) AS cnt FROM judge_workers WHERE heartbeat > ?", (now - WORKER_STALE_AFTER,)
+        ).fetchone()
+        conn.close()
+        return {
+            "depth": queued["cnt"],
+            "oldest_wait": now - queued["oldest"] if queued["oldest"] else 0.0,
+            "avg_run": ran["avg_run"],
+            "workers": workers["cnt"],
+        }
+
+    def pending(self, limit=10):
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT id AS submission_id, problem_id, user_id, attempts, job_class FROM judge_jobs "
+            "WHERE status='queued' ORDER BY priority, user_round, enqueued_at LIMIT ?",
+            (limit,)
+        ).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    # ---------------- worker registry ----------------
+    def set_worker_status(self, worker_id, status, submission_id=None):
+        conn = self.connect()
+        conn.execute(
+            "INSERT INTO judge_workers (id, host, pid, status, submission_id, heartbeat) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status=excluded.status, submission_id=excluded.submission_id, "
+            "heartbeat=excluded.heartbeat",
+            (worker_id, socket.gethostname(), os.getpid(), status, submission_id, time.time())
+        )
+        conn.commit()
+        conn.close()
+
+    def heartbeat(self, worker_ids):
+        conn = self.connect()
+        conn.executemany("UPDATE judge_workers SET heartbeat=? WHERE id=?", [(time.time(), w) for w in worker_ids])
+        conn.commit()
+        conn.close()
+
+    def remove_worker(self, worker_id):
+        conn = self.connect()
+        conn.execute("DELETE FROM judge_workers WHERE id=?", (worker_id,))
+        conn.commit()
+        conn.close()
+
+    def workers(self):
+        conn = self.connect()
+        # forget workers that stopped sending heartbeats long ago
+        conn.execute("DELETE FROM judge_workers WHERE heartbeat < ?", (time.time() - WORKER_STALE_AFTER * 20,))
+        conn.commit()
+        rows = conn.execute("SELECT * FROM judge_workers ORDER BY id").fetchall()
+        conn.close()
+        now = time.time()
+        workers = {}
+        for r in rows:
+            status = r["status"] if now - r["heartbeat"] < WORKER_STALE_AFTER else "offline"
+            workers[r["id"]] = {"status": status, "submission_id": r["submission_id"], "host": r["host"]}
+        return workers
+
+
+# ---------------------- Local Stand-in ----------------------
+class MemoryJobQueue:
+    """In-process stand-in with the same interface, for running without a shared DB.
+
+    Nothing survives a restart and only workers in this process can see the jobs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.changed = threading.Condition()
+        self.jobs = {}
+        self.events = {}
+        self.next_event_id = 1
+        self.worker_stats = {}
+
+    def enqueue(self, submission_id, code, problem_id, user_id, mode="submit", klass=None):
+        klass = klass or job_class(mode)
+        now = time.time()
+        with self.lock:
+            user_round = sum(1 for j in self.jobs.values() if j["user_id"] == user_id and j["job_class"] == klass
+                             and j["status"] in ("queued", "running"))
+            self.jobs[submission_id] = {
+                "id": submission_id, "problem_id": problem_id, "user_id": user_id, "code": code, "mode": mode,
+                "job_class": klass, "priority": PRIORITY_CLASSES[klass], "user_round": user_round,
+                "status": "queued", "attempts": 0, "lease_owner": None, "lease_expires": None,
+                "available_at": now, "enqueued_at": now, "started_at": None, "finished_at": None,
+                "result": None, "error": None
+            }
+        self.wakeup.set()
+
+    def lease(self, owner, lease_seconds=VISIBILITY_TIMEOUT):
+        now = time.time()
+        with self.lock:
+            expired = []
+            running = {}
+            for job in self.jobs.values():
+                if job["status"] != "running":
+                    continue
+                if job["lease_expires"] < now and job["attempts"] >= MAX_ATTEMPTS:
+                    job.update(status="dead", error=job["error"] or "Judge worker stopped responding", finished_at=now)
+                elif job["lease_expires"] < now:
+                    expired.append(job)
+                else:
+                    running[job["user_id"]] = running.get(job["user_id"], 0) + 1
+            if expired:
+                job = min(expired, key=lambda j: (j["priority"], j["enqueued_at"]))
+            else:
+                ready = [j for j in self.jobs.values() if j["status"] == "queued" and j["available_at"] <= now
+                         and running.get(j["user_id"], 0) < MAX_IN_FLIGHT_PER_USER]
+                if not ready:
+                    return None
+                job = min(ready, key=lambda j: (j["priority"], j["user_round"], j["enqueued_at"]))
+            job.update(status="running", lease_owner=owner, lease_expires=now + lease_seconds,
+                       started_at=now, attempts=job["attempts"] + 1)
+            return dict(job)
+
+    def extend(self, owner, lease_seconds=VISIBILITY_TIMEOUT):
+        with self.lock:
+            for job in self.jobs.values():
+                if job["status"] == "running" and job["lease_owner"] == owner:
+                    job["lease_expires"] = time.time() + lease_seconds
+
+    def complete(self, job_id, owner, result):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and job["lease_owner"] == owner:
+                job.update(status="done", result=json.dumps(result), lease_owner=None, finished_at=time.time())
+                self.events.pop(job_id, None)
+        self.notify()
+
+    def fail(self, job_id, owner, error):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and job["lease_owner"] == owner:
+                if job["attempts"] >= MAX_ATTEMPTS:
+                    job.update(status="dead", error=error, lease_owner=None, finished_at=time.time())
+                else:
+                    job.update(status="queued", error=error, lease_owner=None,
+                               available_at=time.time() + RETRY_DELAY * job["attempts"])
+                self.events.pop(job_id, None)
+        self.notify()
+
+    def publish(self, job_id, kind, payload):
+        with self.lock:
+            self.events.setdefault(job_id, []).append((self.next_event_id, kind, payload))
+            self.next_event_id += 1
+        self.notify()
+
+    def events_since(self, job_id, after_id=0):
+        with self.lock:
+            return [e for e in self.events.get(job_id, []) if e[0] > after_id]
+
+    def notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def wait_for_events(self, timeout):
+        with self.changed:
+            self.changed.wait(timeout)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return {k: job[k] for k in ("id", "status", "result", "error")} if job else None
+
+    def purge_finished(self, older_than=JOB_RESULT_RETENTION):
+        cutoff = time.time() - older_than
+        with self.lock:
+            finished = [j["id"] for j in self.jobs.values()
+                        if j["status"] in ("done", "dead") and j["finished_at"] < cutoff]
+            for job_id in finished:
+                del self.jobs[job_id]
+        return len(finished)
+
+    def depth(self):
+        with self.lock:
+            return sum(1 for j in self.jobs.values() if j["status"] == "queued")
+
+    def class_depths(self):
+        depths = dict.fromkeys(PRIORITY_CLASSES, 0)
+        with self.lock:
+            for job in self.jobs.values():
+                if job["status"] == "queued":
+                    depths[job["job_class"]] += 1
+        return depths
+
+    def load(self, window=LOAD_WINDOW):
+        now = time.time()
+        with self.lock:
+            queued = [j["enqueued_at"] for j in self.jobs.values() if j["status"] == "queued"]
+            runs = [j["finished_at"] - j["started_at"] for j in self.jobs.values()
+                    if j["status"] == "done" and j["started_at"] and j["finished_at"] > now - window]
+        return {
+            "depth": len(queued),
+            "oldest_wait": now - min(queued) if queued else 0.0,
+            "avg_run": sum(runs) / len(runs) if runs else None,
+            "workers": len(self.worker_stats),
+        }
+
+    def pending(self, limit=10):
+        with self.lock:
+            queued = sorted((j for j in self.jobs.values() if j["status"] == "queued"),
+                            key=lambda j: (j["priority"], j["user_round"], j["enqueued_at"]))
+            return [{"submission_id": j["id"], "problem_id": j["problem_id"], "user_id": j["user_id"],
+                     "attempts": j["attempts"], "job_class": j["job_class"]} for j in queued[:limit]]
+
+    def set_worker_status(self, worker_id, status, submission_id=None):
+        self.worker_stats[worker_id] = {"status": status, "submission_id": submission_id, "host": socket.gethostname()}
+
+    def heartbeat(self, worker_ids):
+        pass
+
+    def remove_worker(self, worker_id):
+        self.worker_stats.pop(worker_id, None)
+
+    def workers(self):
+        return dict(self.worker_stats)
+
+
+def make_job_queue():
+    if os.environ.get("JUDGE_QUEUE", "sqlite") == "memory":
+        return MemoryJobQueue()
+    return SQLiteJobQueue()
@@ -0,0 +1,120 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------- Latency Histograms ----------------------
+# Prometheus-style histograms kept in memory by each process. The web app serves
+# them on /metrics; a standalone judge serves its own with --metrics-port.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, name, description, label_names, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            # the last slot counts observations above the largest bucket (le="+Inf")
+            series["buckets"][bisect_left(self.buckets, seconds)] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self.lock:
+            return sorted((key, {"buckets": list(s["buckets"]), "sum": s["sum"], "count": s["count"]})
+                          for key, s in self.series.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, series in self.snapshot():
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, key))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series["buckets"]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series['sum']}")
+            lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return "\n".join(lines)
+
+    def summary(self):
+        """{"label values": {"count", "avg", "p50", "p95", "p99"}}, times in ms."""
+        summary = {}
+        for key, series in self.snapshot():
+            count = series["count"]
+            summary[" ".join(key)] = {
+                "count": count,
+                "avg": round(series["sum"] / count * 1000, 2) if count else 0.0,
+                "p50": round(self.quantile(series, 0.5) * 1000, 2),
+                "p95": round(self.quantile(series, 0.95) * 1000, 2),
+                "p99": round(self.quantile(series, 0.99) * 1000, 2),
+            }
+        return summary
+
+    def quantile(self, series, q):
+        # linear interpolation inside the bucket holding the q-th observation, like histogram_quantile()
+        rank = q * series["count"]
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, series["buckets"]):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1] if series["count"] else 0.0
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# stages: enqueue_wait, sandbox_wait, container_start, test_case_fetch, file_write,
+# execution, parse, db_persist and total (lease to saved result)
+stage_seconds = Histogram("judge_stage_seconds", "Time spent in each stage of judging a submission.", ("stage",))
+request_seconds = Histogram("http_request_duration_seconds", "Flask request latency by route.",
+                            ("method", "route", "status"))
+HISTOGRAMS = [stage_seconds, request_seconds]
+
+
+def render():
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
+
+
+def serve(port):
+    """Serve render() on http://0.0.0.0:<port>/metrics from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from db import release_connection
+
+# ---------------------- System Sampler ----------------------
+# One background thread samples CPU, memory, queue depth, worker states and the
+# sandbox containers every SAMPLE_INTERVAL seconds into a ring buffer holding
+# HISTORY_SECONDS of history. The admin routes only read from it, so a request
+# never waits on psutil or docker.
+SAMPLE_INTERVAL = 2
+HISTORY_SECONDS = 3600
+# `docker stats` takes a second or two, so containers are sampled less often
+CONTAINER_STATS_EVERY = 5
+CONTAINER_PREFIX = "sandbox-"
+
+
+def container_stats():
+    """[{"name", "cpu", "mem", "mem_usage"}] for the running sandbox containers; [] without docker."""
+    try:
+        completed = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{json .}}"],
+            capture_output=True, text=True, timeout=10
+        )
+    except (subprocess.SubprocessError, OSError):
+        return []
+    stats = []
+    for line in completed.stdout.splitlines():
+        try:
+            row = json.loads(line)
+            if not row.get("Name", "").startswith(CONTAINER_PREFIX):
+                continue
+            stats.append({
+                "name": row["Name"],
+                "cpu": float(row["CPUPerc"].rstrip("%")),
+                "mem": float(row["MemPerc"].rstrip("%")),
+                "mem_usage": row.get("MemUsage", ""),
+            })
+        except (ValueError, KeyError, AttributeError):
+            continue
+    return stats
+
+
+class Sampler:
+    def __init__(self, job_queue, interval=SAMPLE_INTERVAL, history=HISTORY_SECONDS):
+        self.job_queue = job_queue
+        self.interval = interval
+        self.samples = deque(maxlen=max(1, int(history / interval)))
+        self.workers = {}
+        self.containers = []
+        self.changed = threading.Condition()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        # cpu_percent(None) measures since the previous call; the first one only sets the baseline
+        psutil.cpu_percent(interval=None)
+        ticks = 0
+        while True:
+            time.sleep(self.interval)
+            if ticks % CONTAINER_STATS_EVERY == 0:
+                self.containers = container_stats()
+            ticks += 1
+            try:
+                sample = self.sample()
+            except Exception as e:
+                print(f"System sampler failed: {e}")
+                continue
+            finally:
+                release_connection()
+            with self.changed:
+                self.samples.append(sample)
+                self.changed.notify_all()
+
+    def sample(self):
+        self.workers = self.job_queue.workers()
+        states = {"idle": 0, "busy": 0, "offline": 0}
+        for worker in self.workers.values():
+            states[worker["status"]] = states.get(worker["status"], 0) + 1
+        return {
+            "time": time.time(),
+            "cpu": psutil.cpu_percent(interval=None),
+            "mem": psutil.virtual_memory().percent,
+            "queue": self.job_queue.depth(),
+            "queueByClass": self.job_queue.class_depths(),
+            "workers": states,
+            "containers": self.containers,
+        }
+
+    def latest(self):
+        with self.changed:
+            return self.samples[-1] if self.samples else None
+
+    def cpu(self):
+        """CPU % of the latest sample, or None if there is none from the last few intervals."""
+        sample = self.latest()
+        if sample is None or time.time() - sample["time"] > 3 * self.interval:
+            return None
+        return sample["cpu"]
+
+    def history(self, since=None, until=None):
+        """Samples with since < time <= until, oldest first."""
+        with self.changed:
+            samples = list(self.samples)
+        return [s for s in samples
+                if (since is None or s["time"] > since) and (until is None or s["time"] <= until)]
+
+    def wait(self, after, timeout):
+        """Samples newer than `after`, waiting up to `timeout` seconds for one."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.samples and self.samples[-1]["time"] > after, timeout)
+        return self.history(since=after)
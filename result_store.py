@@ -0,0 +1,146 @@
+import json
+import queue
+import threading
+from datetime import datetime
+
+import contests
+import user_stats
+import verdict_cache
+from db import get_db_connection
+
+# ---------------------- Result Persistence ----------------------
+# Everything a finished submission writes (status row, per-case rows, the
+# contribution bump, user stats, the contest verdict log, the verdict cache
+# entry) goes through save_result() and lands in one transaction. With
+# GROUP_COMMIT on, a single writer thread commits whatever results are waiting
+# together, so a burst of finished submissions costs one commit instead of one each.
+GROUP_COMMIT = True
+GROUP_COMMIT_MAX = 32
+
+
+def db_value(value):
+    # lists/dicts can't be bound as parameters; JSON round-trips them exactly
+    return None if value is None else json.dumps(value)
+
+
+def write_result(conn, record):
+    previous = conn.execute(
+        "SELECT status, problem_id FROM submissions WHERE UniqID = ?", (record["submission_id"],)
+    ).fetchone()
+    conn.execute(
+        "UPDATE submissions SET status=?, memory=?, runtime=?, error=? WHERE UniqID = ?",
+        (record["status"], record["memory"], record["runtime"], record.get("error"), record["submission_id"])
+    )
+    # a retried job replaces the rows of an earlier attempt instead of duplicating them
+    conn.execute("DELETE FROM testcaseSub WHERE subID = ?", (record["submission_id"],))
+    conn.executemany(
+        "INSERT INTO testcaseSub (subID, input, expected, printed, output, verdict, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(record["submission_id"], db_value(r["input"]), db_value(r["expected"]), r["printed"],
+          db_value(r["output"]), r["verdict"], r["error"]) for r in record["results"]]
+    )
+    # a retried job's earlier attempt already counted this submission
+    if previous is None or previous["status"] == "Pending":
+        day = datetime.today().strftime('%Y-%m-%d')
+        conn.execute("""
+        INSERT INTO contributions (user_id, contribution_date, count)
+        VALUES (?, ?, 1)
+        ON CONFLICT(user_id, contribution_date)
+        DO UPDATE SET count = count + 1
+        """, (record["user_id"], day))
+        problem_id = previous["problem_id"] if previous else record.get("problem_id")
+        user_stats.record(conn, record["user_id"], problem_id, record["status"], day,
+                          attempt=record.get("mode", "submit") == "submit")
+        contests.record_verdict(conn, record["submission_id"], user_stats.is_accepted(record["status"]))
+    if record.get("cache_key"):
+        verdict_cache.count_lookup(conn, record["cache_key"], record.get("cache_hit", False))
+    if record.get("cache_key") and not record.get("cache_hit"):
+        verdict_cache.store(conn, record["cache_key"], record["problem_id"], record["status"],
+                            record["memory"], record["runtime"], record["results"])
+
+
+def write_results(records):
+    conn = get_db_connection()
+    try:
+        for record in records:
+            write_result(conn, record)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class ResultWriter:
+    def __init__(self):
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.commits = 0
+        self.written = 0
+
+    def save(self, record):
+        """Persist `record` and return once it is committed; raises if the write failed."""
+        if not GROUP_COMMIT:
+            write_results([record])
+            return
+        self.start()
+        done = {"event": threading.Event(), "error": None}
+        self.pending.put((record, done))
+        done["event"].wait()
+        if done["error"] is not None:
+            raise done["error"]
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            # no waiting for company: whatever queued up during the last commit goes in the next one
+            batch = [self.pending.get()]
+            while len(batch) < GROUP_COMMIT_MAX:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                write_results([record for record, _ in batch])
+                errors = [None] * len(batch)
+                self.commits += 1
+            except Exception:
+                # one bad record must not fail the rest of the batch
+                errors = []
+                for record, _ in batch:
+                    try:
+                        write_results([record])
+                        errors.append(None)
+                        self.commits += 1
+                    except Exception as e:
+                        errors.append(e)
+            self.written += len(batch)
+            for (_, done), error in zip(batch, errors):
+                done["error"] = error
+                done["event"].set()
+
+
+writer = ResultWriter()
+
+
+def save_result(submission_id, user_id, status, memory, runtime, results, error=None,
+                problem_id=None, cache_key=None, cache_hit=False, mode="submit"):
+    writer.save({
+        "submission_id": submission_id,
+        "user_id": user_id,
+        "status": status,
+        "memory": memory,
+        "runtime": runtime,
+        "error": error,
+        "results": results,
+        "problem_id": problem_id,
+        "cache_key": cache_key,
+        "cache_hit": cache_hit,
+        "mode": mode,
+    })
@@ -1,26 +1,63 @@
 import os
-import sqlite3
 from functools import wraps
-from flask import Flask, flash, redirect, url_for, render_template, request, jsonify
+from flask import Flask, abort, flash, redirect, url_for, render_template, request, jsonify, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Email, EqualTo, Length
 from collections import defaultdict
-from datetime import datetime
-import psutil
-import subprocess
+from datetime import date, datetime, timedelta
 import json
-import queue
-
+import sqlite3
 import threading
+import time
 import uuid
+import ast
+
+import catalog
+import checkers
+import contests
+import judge
+import metrics
+import testdata
+import user_stats
+import users
+from db import get_db_connection, release_connection, init_schema
+from judge_queue import make_job_queue, job_class
+from cache import TTLCache, CachedCount
+from monitor import Sampler
+import verdict_cache
+from search import (init_search_index, index_problem, unindex_problem, match_query, search_join,
+                    init_tag_table, set_problem_tags, remove_problem_tags, topic_filter, topic_counts)
 
 # ---------------------- Flask App ----------------------
 app = Flask(__name__)
 app.secret_key = 'andir'
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates/ProblemDB.db")
+
+# Judge workers run as threads of this process unless JUDGE_IN_PROCESS=0,
+# in which case start them separately with `python judge.py`
+JUDGE_IN_PROCESS = os.environ.get("JUDGE_IN_PROCESS", "1") == "1"
+job_queue = make_job_queue()
+sampler = Sampler(job_queue)
+
+conn = get_db_connection()
+init_search_index(conn)
+init_tag_table(conn)
+init_schema(conn)
+verdict_cache.init_verdict_cache(conn)
+catalog.init_catalog_version(conn)
+user_stats.init_user_stats(conn)
+contests.init_contests(conn)
+testdata.move_large_cases(conn)
+testdata.split_blobs(conn)
+conn.commit()
+conn.close()
+
+# Cached totals for the paginated lists
+PROBLEM_COUNT_TTL = 300
+problem_counts = TTLCache(maxsize=256, ttl=PROBLEM_COUNT_TTL)
+submission_count = CachedCount(lambda conn: conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0])
 
 # ---------------------- Login Manager ----------------------
 login_manager = LoginManager()
@@ -29,25 +66,6 @@ login_manager.login_view = "login"
 
 
 
-def make_user_object(row):
-    """Convert DB row to Flask-Login compatible object."""
-    if not row:
-        return None
-
-    # Build a dynamic object
-    user_obj = type("UserObj", (), {})()
-    for key in row.keys():
-        setattr(user_obj, key, row[key])
-
-    # Flask-Login required methods
-    user_obj.get_id = lambda: str(user_obj.id)
-    user_obj.is_authenticated = property(lambda self: True)
-    user_obj.is_active = property(lambda self: True)
-    user_obj.is_anonymous = property(lambda self: False)
-
-    return user_obj
-
-
 # ---------------------- Admin Protection ----------------------
 def admin_required(f):
     @wraps(f)
@@ -59,6 +77,41 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# The sampler and in-process judge workers start with the first request, so they run
+# under `python run.py`, `flask run` and WSGI servers alike, once per serving process
+background_lock = threading.Lock()
+background_started = False
+
+def start_background():
+    global background_started
+    with background_lock:
+        if background_started:
+            return
+        background_started = True
+    sampler.start()
+    if JUDGE_IN_PROCESS:
+        judge.start_workers(job_queue)
+
+@app.before_request
+def ensure_background():
+    if not background_started:
+        start_background()
+
+# Request latency per route for /metrics
+@app.before_request
+def start_request_timer():
+    request.started_at = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = getattr(request, "started_at", None)
+    if started is not None:
+        # the route pattern, not the path, so /problem/<id> is one series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.request_seconds.observe(time.perf_counter() - started, method=request.method, route=route,
+                                        status=response.status_code)
+    return response
+
 @app.before_request
 def require_admin_for_admin_prefix():
     if request.path.startswith("/admin"):
@@ -68,19 +121,16 @@ def require_admin_for_admin_prefix():
             flash("Admin access only!", "danger")
             return redirect(url_for("index"))
 
-# ---------------------- DB Connection ----------------------
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Pooled connections go back to the pool even if a route raised before conn.close()
+@app.teardown_request
+def release_db_connection(exc):
+    release_connection()
 
 # ---------------------- User Loader ----------------------
 @login_manager.user_loader
 def load_user(user_id):
-    conn = get_db_connection()
-    row = conn.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
-    conn.close()
-    return make_user_object(row)
+    # from users.user_cache most of the time; see users.py
+    return users.load(user_id)
 
 # ---------------------- Forms ----------------------
 class LoginForm(FlaskForm):
@@ -117,7 +167,8 @@ def login():
         user = conn.execute("SELECT * FROM users WHERE email=?", (form.email.data,)).fetchone()
         conn.close()
         if user and check_password_hash(user["password_hash"], form.password.data):
-            user_obj = make_user_object(user)
+            user_obj = users.User.from_row(user)
+            users.remember(user_obj)
             login_user(user_obj)
             flash("Logged in successfully!", "success")
             return redirect(url_for("dashboard"))
@@ -156,15 +207,60 @@ def logout():
 @app.route("/contributions/<int:id>")
 def getContributions(id):
     conn = get_db_connection()
-    contributions = conn.execute("SELECT contribution_date, count FROM contributions WHERE user_id = ? AND contribution_date >= '2025-01-01' AND contribution_date <= '2025-12-31' ORDER BY contribution_date;", (id,)).fetchall()
+    contributions_dict = contributions_by_month(conn, id, request.args.get("year", datetime.now().year, type=int))
     conn.close()
+    return json.dumps(contributions_dict)
+
+def contributions_by_month(conn, user_id, year):
+    """{month index: [{"dateData": [day, count]}]} for one year of a user's contributions."""
+    # month/day are cut out of the ISO date by SQLite; 0=Jan, 11=Dec
+    contributions = conn.execute("""
+        SELECT CAST(substr(contribution_date, 6, 2) AS INTEGER) - 1, CAST(substr(contribution_date, 9, 2) AS INTEGER), count
+        FROM contributions WHERE user_id = ? AND contribution_date >= ? AND contribution_date <= ? ORDER BY contribution_date
+    """, (user_id, f"{year}-01-01", f"{year}-12-31")).fetchall()
     contributions_dict = defaultdict(list)
-    for contribution in contributions:
-        date_str, count = contribution
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        month_index = date_obj.month - 1  # 0=Jan, 11=Dec
-        contributions_dict[month_index].append({"dateData": [date_obj.day, count]})
-    return json.dumps(dict(contributions_dict))
+    for month_index, day, count in contributions:
+        contributions_dict[month_index].append({"dateData": [day, count]})
+    return dict(contributions_dict)
+
+# Rolling window of contributions: ?days= (default 365) ending at ?end= (ISO date, default today)
+CALENDAR_DAYS = 365
+CALENDAR_DAYS_MAX = 3 * 366
+
+@app.route("/contributions/<int:id>/calendar")
+@login_required
+def contribution_calendar(id):
+    days = min(max(request.args.get("days", CALENDAR_DAYS, type=int), 1), CALENDAR_DAYS_MAX)
+    try:
+        end = date.fromisoformat(request.args["end"]) if "end" in request.args else date.today()
+    except ValueError:
+        return jsonify({"error": "end must be an ISO date (YYYY-MM-DD)"}), 400
+    start = end - timedelta(days=days - 1)
+    conn = get_db_connection()
+    entries = user_stats.calendar(conn, id, start, end)
+    conn.close()
+    return jsonify({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": entries,
+        "total": sum(count for _, count in entries),
+    })
+
+@app.route("/user_stats/<int:id>")
+@login_required
+def get_user_stats(id):
+    conn = get_db_connection()
+    stats = user_stats.stats(conn, id)
+    conn.close()
+    return jsonify(stats)
+
+def total_problems(conn):
+    # problem_counts is cleared whenever a problem is added or deleted
+    total = problem_counts.get("total")
+    if total is None:
+        total = conn.execute("SELECT COUNT(*) FROM problems").fetchone()[0]
+        problem_counts.set("total", total)
+    return total
 
 @login_required
 @app.route("/profile_data/<int:id>")
@@ -199,19 +295,21 @@ def update_profile(user_id):
     if not data:
         return jsonify({"error": "Missing JSON body"}), 400
 
-    username = data.get("username")
-    email = data.get("email")
-
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-
-    if username:
-        user.username = username
-    if email:
-        user.email = email
-
-    db.session.commit()
+    updates = {field: data[field] for field in ("username", "email") if data.get(field)}
+    if updates:
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                f"UPDATE users SET {', '.join(f'{field}=?' for field in updates)} WHERE id=?",
+                (*updates.values(), user_id)
+            )
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return jsonify({"error": "Username or email already taken"}), 409
+        finally:
+            conn.close()
+        users.forget(user_id)
 
     return jsonify({"message": "Profile updated successfully"})
 
@@ -219,7 +317,10 @@ def update_profile(user_id):
 @login_required
 @app.route("/problemsheet")
 def problemsheet():
-    return render_template("ProblemSheet.html")
+    conn = get_db_connection()
+    topics = topic_counts(conn)
+    conn.close()
+    return render_template("ProblemSheet.html", topics=topics)
 
 @app.route("/api/problems")
 @login_required
@@ -241,62 +342,61 @@ def api_problems():
     conn = get_db_connection()
     params = []
     where_clauses = []
+    join_sql = ""
+    order_sql = "ORDER BY id"
 
-    # Use case-insensitive searching by lowercasing fields and parameters
+    # Full-text search on title/description through the FTS5 index, best matches first
     if q:
-        qparam = f"%{q.lower()}%"
-        where_clauses.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ?)")
-        params.extend([qparam, qparam])
+        match = match_query(q, ["title", "description"])
+        if match:
+            join_sql, params = search_join(match)
+            order_sql = "ORDER BY hits.fts_rank, id"
+        else:
+            where_clauses.append("0")
 
     # difficulty filter (case-insensitive, allow partial matches)
     if category and category.lower() != "all":
         where_clauses.append("LOWER(TRIM(diff)) LIKE ?")
         params.append(f"%{category.lower()}%")
 
-    # detect if problems table has a 'tags' column
-    cols_info = conn.execute("PRAGMA table_info(problems)").fetchall()
-    cols = [c["name"] for c in cols_info]
-    has_tags = "tags" in cols
-
-    # topics filter: if tags column exists, match against it; otherwise fallback to searching title/description
+    # topics filter: problems tagged with any of the selected topics
+    topics = [t.strip() for t in topics if t.strip()]
     if topics:
-        # normalize and remove empty
-        topics = [t.strip() for t in topics if t.strip()]
-        if topics:
-            if has_tags:
-                topic_clauses = []
-                for _ in topics:
-                    topic_clauses.append("LOWER(tags) LIKE ?")
-                    params.append(f"%{_.lower()}%")
-                where_clauses.append("(" + " OR ".join(topic_clauses) + ")")
-            else:
-                # fallback: search topics in LOWER(title) or LOWER(description)
-                topic_clauses = []
-                for _ in topics:
-                    topic_clauses.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ?)")
-                    params.extend([f"%{_.lower()}%", f"%{_.lower()}%"])
-                where_clauses.append("(" + " OR ".join(topic_clauses) + ")")
+        clause, topic_params = topic_filter(topics)
+        where_clauses.append(clause)
+        params.extend(topic_params)
 
     where_sql = ""
     if where_clauses:
         where_sql = "WHERE " + " AND ".join(where_clauses)
 
-    # total count
-    count_row = conn.execute(f"SELECT COUNT(*) as cnt FROM problems {where_sql}", params).fetchone()
-    total = count_row["cnt"] if count_row else 0
-
-    offset = (page - 1) * per_page
-
-    # build select columns dynamically if tags exists
-    select_cols = "id, title, description, diff"
-    if has_tags:
-        select_cols += ", tags"
-
-    rows = conn.execute(
-        f"SELECT {select_cols} FROM problems {where_sql} ORDER BY id LIMIT ? OFFSET ?",
-        params + [per_page, offset]
-    ).fetchall()
+    # Pages are keyed by the last id of the previous page (?after=) whenever results are in
+    # id order, so deep pages cost the same as the first; ranked searches fall back to OFFSET.
+    # The total comes from a per-filter cache instead of a COUNT on every request.
+    count_key = (q, category.lower(), tuple(sorted(t.lower() for t in topics)))
+    total = problem_counts.get(count_key)
+    if total is None:
+        total = conn.execute(f"SELECT COUNT(*) as cnt FROM problems {join_sql} {where_sql}", params).fetchone()["cnt"]
+        problem_counts.set(count_key, total)
+
+    select_cols = "id, title, description, diff, tags"
+    after = request.args.get("after", type=int)
+    keyset = not join_sql
+    if keyset and after is not None:
+        where_sql += (" AND " if where_sql else "WHERE ") + "id > ?"
+        rows = conn.execute(
+            f"SELECT {select_cols} FROM problems {where_sql} ORDER BY id LIMIT ?",
+            params + [after, per_page + 1]
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT {select_cols} FROM problems {join_sql} {where_sql} {order_sql} LIMIT ? OFFSET ?",
+            params + [per_page + 1, (page - 1) * per_page]
+        ).fetchall()
     conn.close()
+    # one row past the page says whether there is a next one
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
 
     problems = []
     for r in rows:
@@ -306,16 +406,16 @@ def api_problems():
             "id": r["id"],
             "title": r["title"],
             "diff": r["diff"],
-            "description": snippet
+            "description": snippet,
+            "tags": r["tags"] or ""
         }
-        if has_tags:
-            problem_obj["tags"] = r["tags"] or ""
         problems.append(problem_obj)
 
     return jsonify({
         "total": total,
         "page": page,
         "per_page": per_page,
+        "next_cursor": rows[-1]["id"] if keyset and has_more else None,
         "problems": problems
     })
 
@@ -327,20 +427,122 @@ def api_problems():
 @app.route("/editor/<int:id>")
 @login_required
 def index(id):
+    # ?contest=<id>: "submit" goes to that contest instead of /run
+    return render_template("index.html", editor_id=id, contest_id=request.args.get("contest", type=int))
 
-    return render_template("index.html", editor_id=id)
 
+# ---------------------- Contests ----------------------
+def contest_view(row, now):
+    contest = dict(row)
+    contest["phase"] = contests.phase(row, now)
+    contest["start"] = datetime.fromtimestamp(row["start_time"]).strftime("%Y-%m-%d %H:%M")
+    contest["end"] = datetime.fromtimestamp(row["end_time"]).strftime("%Y-%m-%d %H:%M")
+    return contest
 
-# Contest page
 @app.route('/contest')
 @login_required
 def contest():
-    # placeholder static contests (no DB required)
-    contests = [
-        {"id": 1, "title": "Тэмцээн 1", "date": "2025-06-01", "description": "Сурын тэмцээн"},
-        {"id": 2, "title": "Тэмцээн 2", "date": "2025-07-15", "description": "Дижитал тэмцээн"}
-    ]
-    return render_template('Contest.html', contests=contests)
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM contests ORDER BY start_time DESC").fetchall()
+    registered = {row["contest_id"] for row in conn.execute(
+        "SELECT contest_id FROM contest_registrations WHERE user_id = ?", (current_user.id,))}
+    conn.close()
+    now = time.time()
+    contest_list = [dict(contest_view(row, now), registered=row["id"] in registered) for row in rows]
+    return render_template('Contest.html', contests=contest_list)
+
+@app.route('/contest/<int:contest_id>')
+@login_required
+def contest_page(contest_id):
+    conn = get_db_connection()
+    row = contests.get_contest(conn, contest_id)
+    if row is None:
+        conn.close()
+        abort(404)
+    contest_info = contest_view(row, time.time())
+    registered = contests.is_registered(conn, contest_id, current_user.id)
+    # the problem set stays hidden until the start, except to admins
+    problems = []
+    if contest_info["phase"] != "upcoming" or current_user.is_admin:
+        problems = [dict(p) for p in contests.contest_problems(conn, contest_id)]
+    conn.close()
+    return render_template('ContestPage.html', contest=contest_info, problems=problems, registered=registered)
+
+@app.route('/contest/<int:contest_id>/register', methods=['POST'])
+@login_required
+def contest_register(contest_id):
+    conn = get_db_connection()
+    row = contests.get_contest(conn, contest_id)
+    if row is None:
+        conn.close()
+        return jsonify({"error": "Contest not found"}), 404
+    if contests.phase(row) == "finished":
+        conn.close()
+        return jsonify({"error": "Contest is over"}), 403
+    contests.register(conn, contest_id, current_user.id)
+    conn.commit()
+    conn.close()
+    return jsonify({"registered": True})
+
+@app.route('/contest/<int:contest_id>/submit', methods=['POST'])
+@login_required
+def contest_submit(contest_id):
+    data = request.get_json(silent=True)
+    if not data or "code" not in data or "problem_id" not in data:
+        return jsonify({"error": "Missing 'code' or 'problem_id'"}), 400
+    try:
+        problem_id = int(data["problem_id"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "problem_id must be an integer"}), 400
+    conn = get_db_connection()
+    row = contests.get_contest(conn, contest_id)
+    error = None
+    if row is None:
+        error = ({"error": "Contest not found"}, 404)
+    elif contests.phase(row) != "running":
+        error = ({"error": "Contest is not running"}, 403)
+    elif not contests.is_registered(conn, contest_id, current_user.id):
+        error = ({"error": "Not registered for this contest"}, 403)
+    elif problem_id not in {p["problem_id"] for p in contests.contest_problems(conn, contest_id)}:
+        error = ({"error": "Problem is not part of this contest"}, 400)
+    if error is not None:
+        conn.close()
+        return jsonify(error[0]), error[1]
+    busy = queue_full_response()
+    if busy is not None:
+        conn.close()
+        return busy
+    submission_id = store_submission(conn, problem_id, data["code"])
+    contests.record_submission(conn, submission_id, contest_id, current_user.id, problem_id)
+    conn.commit()
+    conn.close()
+    submission_count.add(1)
+    # contest submits are judged ahead of practice ones
+    job_queue.enqueue(submission_id, data["code"], problem_id, current_user.id, "submit",
+                      klass=job_class("submit", contest=True))
+    return jsonify({"submission_id": submission_id})
+
+# ?offset=&limit= for a page, ?around=me (&radius=) for the rows around the caller;
+# admins can add ?live=1 to see through a freeze
+@app.route('/contest/<int:contest_id>/scoreboard')
+@login_required
+def contest_scoreboard(contest_id):
+    conn = get_db_connection()
+    board = contests.scoreboard(conn, contest_id)
+    conn.close()
+    if board is None:
+        return jsonify({"error": "Contest not found"}), 404
+    live = bool(current_user.is_admin) and request.args.get("live") == "1"
+    if request.args.get("around") == "me":
+        radius = min(max(request.args.get("radius", contests.AROUND_RADIUS, type=int), 0), contests.PAGE_SIZE_MAX // 2)
+        result = board.around(current_user.id, radius, live)
+        if result is None:
+            return jsonify({"error": "Not on this scoreboard"}), 404
+    else:
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limit = min(max(request.args.get("limit", contests.PAGE_SIZE, type=int), 1), contests.PAGE_SIZE_MAX)
+        result = board.page(offset, limit, live)
+    return jsonify(dict(result, **board.status(live)))
 
 
 # Lesson page
@@ -375,54 +577,52 @@ def adminProblem():
     conn = get_db_connection()
     params = []
     where = []
+    join_sql = ""
+    order_sql = "ORDER BY id"
 
+    # Full-text search on title, description and tags
     if q:
-        qparam = f"%{q.lower()}%"
-        where.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ? OR LOWER(IFNULL(tags,'')) LIKE ?)")
-        params.extend([qparam, qparam, qparam])
+        match = match_query(q)
+        if match:
+            join_sql, params = search_join(match)
+            order_sql = "ORDER BY hits.fts_rank, id"
+        else:
+            where.append("0")
 
     if category and category.lower() != "all":
         where.append("LOWER(TRIM(diff)) LIKE ?")
         params.append(f"%{category.lower()}%")
 
-    # topics filter will be matched against tags column if present, otherwise fallback to title/description
-    cols_info = conn.execute("PRAGMA table_info(problems)").fetchall()
-    cols = [c["name"] for c in cols_info]
-    has_tags = "tags" in cols
-
-    if topics_selected:
-        topics = [t.strip() for t in topics_selected if t.strip()]
-        if topics:
-            if has_tags:
-                topic_clauses = []
-                for _ in topics:
-                    topic_clauses.append("LOWER(tags) LIKE ?")
-                    params.append(f"%{_.lower()}%")
-                where.append("(" + " OR ".join(topic_clauses) + ")")
-            else:
-                topic_clauses = []
-                for _ in topics:
-                    topic_clauses.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ?)")
-                    params.extend([f"%{_.lower()}%", f"%{_.lower()}%"])
-                where.append("(" + " OR ".join(topic_clauses) + ")")
+    topics = [t.strip() for t in topics_selected if t.strip()]
+    if topics:
+        clause, topic_params = topic_filter(topics)
+        where.append(clause)
+        params.extend(topic_params)
 
     where_sql = ""
     if where:
         where_sql = "WHERE " + " AND ".join(where)
 
-    count_row = conn.execute(f"SELECT COUNT(*) as cnt FROM problems {where_sql}", params).fetchone()
-    total = count_row["cnt"] if count_row else 0
-
     offset = (page - 1) * per_page
 
     select_cols = "id, title, description, diff, IFNULL(tags,'') as tags"
     rows = conn.execute(
-        f"SELECT {select_cols} FROM problems {where_sql} ORDER BY id LIMIT ? OFFSET ?",
+        f"SELECT {select_cols}, COUNT(*) OVER () AS total_count FROM problems {join_sql} {where_sql} "
+        f"{order_sql} LIMIT ? OFFSET ?",
         params + [per_page, offset]
     ).fetchall()
+    if rows:
+        total = rows[0]["total_count"]
+    elif offset:
+        total = conn.execute(f"SELECT COUNT(*) as cnt FROM problems {join_sql} {where_sql}", params).fetchone()["cnt"]
+    else:
+        total = 0
+    topic_list = topic_counts(conn)
     conn.close()
 
     problems = [dict(r) for r in rows]
+    for problem in problems:
+        problem.pop("total_count")
 
     return render_template(
         "admin/adminProblems.html",
@@ -432,6 +632,7 @@ def adminProblem():
         total=total,
         q=q,
         category=category,
+        topics=topic_list,
         topics_selected=topics_selected
     )
 
@@ -461,6 +662,28 @@ def adminNews():
     conn.close()
     return render_template('admin/adminNews.html', articles=articles)
 
+# Judge settings on the add/edit problem form; empty number fields mean "use the judge default"
+JUDGE_SETTING_FIELDS = {
+    "total_time_limit": float,
+    "cpu_time_limit": float,
+    "wall_time_limit": float,
+    "memory_limit": int,
+    "pids_limit": int,
+    "output_limit": int,
+}
+
+def judge_settings(form):
+    settings = {"exec_policy": "parallel" if form.get("exec_policy") == "parallel" else "sequential"}
+    settings["checker"] = form.get("checker") if form.get("checker") in checkers.CHECKERS else "exact"
+    settings["checker_arg"] = form.get("checker_arg", "").strip() or None
+    settings["checker_code"] = form.get("checker_code", "").strip() or None
+    for field, kind in JUDGE_SETTING_FIELDS.items():
+        try:
+            settings[field] = kind(form.get(field) or 0) or None
+        except ValueError:
+            settings[field] = None
+    return settings
+
 @app.route('/admin/problems/add', methods=['GET', 'POST'])
 @admin_required
 def add_problem():
@@ -472,10 +695,16 @@ def add_problem():
         constraints = request.form['constraints']
         diff = request.form['diff']
         tags = request.form.get('tags', '')
+        settings = judge_settings(request.form)
         conn = get_db_connection()
-        conn.execute('INSERT INTO problems (title, description, examples, prefix, constraints, diff, tags) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                     (title, description, examples, prefix, constraints, diff, tags))
+        cur = conn.execute(f'INSERT INTO problems (title, description, examples, prefix, constraints, diff, tags, {", ".join(settings)}) '
+                           f'VALUES (?, ?, ?, ?, ?, ?, ?, {", ".join("?" for _ in settings)})',
+                     (title, description, examples, prefix, constraints, diff, tags, *settings.values()))
+        set_problem_tags(conn, cur.lastrowid, tags)
+        index_problem(conn, cur.lastrowid)
+        catalog.bump(conn)
         conn.commit()
+        problem_counts.clear()
         conn.close()
         return redirect(url_for('adminProblem'))
     return render_template('admin/adminProblems.html', problems=[], add=True)
@@ -490,10 +719,19 @@ def edit_problem(id):
         for problem in problems:
             if problem['id'] == id:
                 tags = request.form.get('tags', '')
-                conn.execute('UPDATE problems SET title=? , description=?, examples=?, prefix=?, constraints=?, diff=?, tags=? WHERE id=?',
+                settings = judge_settings(request.form)
+                # limits, checker or exec policy changed: old verdicts may no longer hold
+                if any(problem.get(column) != value for column, value in settings.items()):
+                    verdict_cache.invalidate_problem(conn, id)
+                conn.execute(f'UPDATE problems SET title=? , description=?, examples=?, prefix=?, constraints=?, diff=?, tags=?, '
+                             f'{", ".join(f"{column}=?" for column in settings)} WHERE id=?',
                              (request.form['title'], request.form['description'], request.form['example'], request.form['prefix'],
-                              request.form['constraints'], request.form['diff'], tags, id))
+                              request.form['constraints'], request.form['diff'], tags, *settings.values(), id))
+                set_problem_tags(conn, id, tags)
+                index_problem(conn, id)
+                catalog.bump(conn)
                 conn.commit()
+                problem_counts.clear()
                 conn.close()
                 return redirect(url_for('adminProblem'))
     return render_template('admin/adminProblems.html', testcases=testcases, problem_id=id, edits=True)
@@ -503,7 +741,12 @@ def edit_problem(id):
 def delete_problem(id):
     conn = get_db_connection()
     conn.execute('DELETE FROM problems WHERE id = ?', (id,))
+    verdict_cache.invalidate_problem(conn, id)
+    remove_problem_tags(conn, id)
+    unindex_problem(conn, id)
+    catalog.bump(conn)
     conn.commit()
+    problem_counts.clear()
     conn.close()
     return redirect(url_for('adminProblem'))
 
@@ -520,20 +763,95 @@ def adminSubmissions():
     except (ValueError, TypeError):
         per_page = 20
 
+    # Keyset paging on subID (insertion order, same as subTime): ?before=<subID> is the
+    # next (older) page, ?after=<subID> the previous (newer) one; page is only for display
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+
     conn = get_db_connection()
-    count_row = conn.execute("SELECT COUNT(*) as cnt FROM submissions").fetchone()
-    total = count_row["cnt"] if count_row else 0
+    total = submission_count.get(conn)
+    if after is not None:
+        rows = conn.execute('SELECT * FROM submissions WHERE subID > ? ORDER BY subID LIMIT ?', (after, per_page + 1)).fetchall()
+        has_newer = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_older = True
+    else:
+        if before is not None:
+            rows = conn.execute('SELECT * FROM submissions WHERE subID < ? ORDER BY subID DESC LIMIT ?', (before, per_page + 1)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM submissions ORDER BY subID DESC LIMIT ?', (per_page + 1,)).fetchall()
+            page = 1
+        has_older = len(rows) > per_page
+        rows = rows[:per_page]
+        has_newer = before is not None
+    conn.close()
+    submissions = [dict(row) for row in rows]
+    return render_template('admin/adminSub.html', submissions=submissions, page=page, per_page=per_page, total=total,
+                           has_newer=has_newer and bool(submissions), has_older=has_older and bool(submissions))
 
-    offset = (page - 1) * per_page
-    submissions = conn.execute('SELECT * FROM submissions ORDER BY subTime DESC LIMIT ? OFFSET ?', (per_page, offset)).fetchall()
+@app.route('/admin/users/<int:user_id>/admin', methods=['POST'])
+@admin_required
+def set_user_admin(user_id):
+    # JSON {"is_admin": true|false}; the cached user is dropped so the change applies on their next request
+    data = request.get_json(silent=True) or {}
+    if "is_admin" not in data:
+        return jsonify({"error": "Missing is_admin"}), 400
+    conn = get_db_connection()
+    updated = conn.execute("UPDATE users SET is_admin=? WHERE id=?", (1 if data["is_admin"] else 0, user_id)).rowcount
+    conn.commit()
     conn.close()
-    submissions = [dict(row) for row in submissions]
-    return render_template('admin/adminSub.html', submissions=submissions, page=page, per_page=per_page, total=total)
+    users.forget(user_id)
+    if not updated:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify({"id": user_id, "is_admin": bool(data["is_admin"])})
+
+@app.route('/admin/contests', methods=['GET', 'POST'])
+@admin_required
+def adminContests():
+    conn = get_db_connection()
+    if request.method == 'POST':
+        delete_id = request.form.get('delete_id', type=int)
+        unfreeze_id = request.form.get('unfreeze_id', type=int)
+        if delete_id:
+            contests.delete_contest(conn, delete_id)
+        elif unfreeze_id:
+            contests.unfreeze(conn, unfreeze_id)
+        else:
+            # start/end come from datetime-local inputs, in server local time
+            title = request.form.get('title', '').strip()
+            error = None
+            try:
+                start_time = datetime.strptime(request.form['start'], "%Y-%m-%dT%H:%M").timestamp()
+                end_time = datetime.strptime(request.form['end'], "%Y-%m-%dT%H:%M").timestamp()
+                problem_ids = [int(p) for p in request.form.get('problems', '').replace(' ', '').split(',') if p]
+            except (KeyError, ValueError):
+                error = "Invalid start/end time or problem ids"
+            if error is None and not title:
+                error = "Contest title is required"
+            elif error is None and end_time <= start_time:
+                error = "The contest must end after it starts"
+            elif error is None and not problem_ids:
+                error = "A contest needs at least one problem"
+            if error is not None:
+                flash(error, "danger")
+            else:
+                contests.create_contest(conn, title, request.form.get('description', ''), start_time, end_time,
+                                        request.form.get('freeze_minutes', 0, type=int),
+                                        request.form.get('penalty_minutes', 20, type=int), problem_ids)
+        conn.commit()
+        conn.close()
+        return redirect(url_for('adminContests'))
+    rows = conn.execute("SELECT * FROM contests ORDER BY start_time DESC").fetchall()
+    counts = dict(conn.execute("SELECT contest_id, COUNT(*) FROM contest_registrations GROUP BY contest_id").fetchall())
+    conn.close()
+    now = time.time()
+    contest_list = [dict(contest_view(row, now), registrations=counts.get(row["id"], 0)) for row in rows]
+    return render_template('admin/adminContests.html', contests=contest_list)
 
 @app.route('/admin/system')
 @admin_required
 def adminSystem():
-    return render_template('admin/adminMonitoring.html', worker_count=NUM_WORKERS)
+    return render_template('admin/adminMonitoring.html')
 
 # Submission testcase answer 
 @app.route("/admin/<string:subId>/testCases", methods=['GET']) 
@@ -546,19 +864,81 @@ def admin_SubTC(subId):
     return render_template("admin/adminSubTC.html", subId=subId, subTC=tC)
 
 
+# CPU, memory, worker and container stats come from the background sampler, so none of these block
+# Each open stream holds a server thread, so there are at most MONITOR_STREAM_MAX of
+# them and each ends after MONITOR_STREAM_TIMEOUT; the page then polls /history instead
+MONITOR_STREAM_TIMEOUT = 120
+MONITOR_STREAM_MAX = 2
+monitor_streams = threading.BoundedSemaphore(MONITOR_STREAM_MAX)
+
 @app.route('/admin/system_data')
 @admin_required
 def adminsystemupdate():
-    cpu = psutil.cpu_percent(interval=0.5)
-    mem = psutil.virtual_memory().percent
+    sampler.start()
+    latest = sampler.latest() or {}
+    conn = get_db_connection()
+    verdict_stats = verdict_cache.stats(conn)
+    conn.close()
     return jsonify({
-        "cpu": cpu,
-        "mem": mem,
-        "workerStats": worker_status,
-        "queue": submission_queue.qsize(),
-        "pending_submissions": list(submission_queue.queue)[:10]
+        "cpu": latest.get("cpu"),
+        "mem": latest.get("mem"),
+        "sampledAt": latest.get("time"),
+        "containers": latest.get("containers", []),
+        "workerStats": sampler.workers if latest else job_queue.workers(),
+        "queue": job_queue.depth(),
+        "queueByClass": job_queue.class_depths(),
+        "load": job_queue.load(),
+        "capacity": {"min": judge.MIN_WORKERS, "max": judge.MAX_WORKERS},
+        "pending_submissions": job_queue.pending(10),
+        "resultCache": result_cache.stats(),
+        "verdictCache": verdict_stats,
+        "stageLatency": metrics.stage_seconds.summary(),
+        "routeLatency": metrics.request_seconds.summary()
     })
 
+
+@app.route('/admin/system_data/history')
+@admin_required
+def adminsystemhistory():
+    sampler.start()
+    since = request.args.get("since", type=float)
+    until = request.args.get("until", type=float)
+    return jsonify({
+        "interval": sampler.interval,
+        "capacity": sampler.samples.maxlen,
+        "samples": sampler.history(since, until)
+    })
+
+
+# Server-Sent Events: one "sample" event per new sample; after a "timeout" the dashboard polls /history
+@app.route('/admin/system_data/stream')
+@admin_required
+def adminsystemstream():
+    sampler.start()
+    since = request.args.get("since", type=float) or time.time()
+    if not monitor_streams.acquire(blocking=False):
+        return jsonify({"error": "Too many monitor streams, poll /admin/system_data/history"}), 503
+
+    def generate():
+        last = since
+        deadline = time.time() + MONITOR_STREAM_TIMEOUT
+        while time.time() < deadline:
+            for sample in sampler.wait(last, sampler.interval * 2):
+                last = sample["time"]
+                yield f"event: sample\ndata: {json.dumps(sample)}\n\n"
+        yield "event: timeout\ndata: {}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # runs when the server is done with the response, also if the client went away early
+    response.call_on_close(monitor_streams.release)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/admin/problem/<int:problem_id>/update_all_testcases", methods=["POST"]) 
 @admin_required
 def update_all_testcases(problem_id): 
@@ -569,11 +949,14 @@ def update_all_testcases(problem_id):
         tc_id = tc["id"] 
         input_data = request.form.get(f"input_{tc_id}") 
         expected_output = request.form.get(f"expected_{tc_id}") 
+        # file-backed cases have no fields on the form and are left alone
         if input_data is not None and expected_output is not None: 
-            conn.execute( "UPDATE test_cases SET input = ?, expected = ? WHERE id = ?", (input_data, expected_output, tc_id) ) 
-            conn.commit() 
-            conn.close() 
-            return redirect(url_for("admin_testcases", problem_id=problem_id))
+            update_testcase(conn, tc_id, input_data, expected_output)
+    verdict_cache.invalidate_problem(conn, problem_id)
+    catalog.bump(conn)
+    conn.commit() 
+    conn.close() 
+    return redirect(url_for("admin_testcases", problem_id=problem_id))
 
 
 @app.route("/admin/problem/<int:problem_id>/testcases")
@@ -587,16 +970,33 @@ def admin_testcases(problem_id):
         return f"⚠️ Problem with id {problem_id} not found", 404
     return render_template("admin/adminTestcases.html", problem=problem, testcases=testcases, id=problem_id)
 
+# Large inputs/expected outputs can be uploaded as files; over testdata.INLINE_LIMIT they are stored outside the DB
+def testcase_text(field, file_field):
+    upload = request.files.get(file_field)
+    if upload and upload.filename:
+        return upload.read().decode("utf-8")
+    return request.form[field]
+
+def update_testcase(conn, testcase_id, input_data, expected_output):
+    columns = testdata.case_columns(input_data, expected_output)
+    conn.execute(
+        f"UPDATE test_cases SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+        (*columns.values(), testcase_id)
+    )
+
 @app.route("/admin/problem/<int:problem_id>/testcases/add", methods=["POST"])
 @admin_required
 def add_testcase(problem_id):
-    input_data = request.form["input_data"]
-    expected_output = request.form["expected_output"]
+    input_data = testcase_text("input_data", "input_file")
+    expected_output = testcase_text("expected_output", "expected_file")
+    columns = testdata.case_columns(input_data, expected_output)
     conn = get_db_connection()
     conn.execute(
-        "INSERT INTO test_cases (problem_id, input, expected) VALUES (?, ?, ?)",
-        (problem_id, input_data, expected_output)
+        f"INSERT INTO test_cases (problem_id, {', '.join(columns)}) VALUES (?, {', '.join('?' for _ in columns)})",
+        (problem_id, *columns.values())
     )
+    verdict_cache.invalidate_problem(conn, problem_id)
+    catalog.bump(conn)
     conn.commit()
     conn.close()
     return redirect(url_for("admin_testcases", problem_id=problem_id))
@@ -604,13 +1004,12 @@ def add_testcase(problem_id):
 @app.route("/admin/problem/<int:problem_id>/testcases/<int:testcase_id>/edit", methods=["POST"])
 @admin_required
 def edit_testcase(problem_id, testcase_id):
-    input_data = request.form["input_data"]
-    expected_output = request.form["expected_output"]
+    input_data = testcase_text("input_data", "input_file")
+    expected_output = testcase_text("expected_output", "expected_file")
     conn = get_db_connection()
-    conn.execute(
-        "UPDATE test_cases SET input = ?, expected = ? WHERE id = ?",
-        (input_data, expected_output, testcase_id)
-    )
+    update_testcase(conn, testcase_id, input_data, expected_output)
+    verdict_cache.invalidate_problem(conn, problem_id)
+    catalog.bump(conn)
     conn.commit()
     conn.close()
     return redirect(url_for("admin_testcases", problem_id=problem_id))
@@ -620,29 +1019,59 @@ def edit_testcase(problem_id, testcase_id):
 def delete_testcase(problem_id, testcase_id):
     conn = get_db_connection()
     conn.execute("DELETE FROM test_cases WHERE id = ?", (testcase_id,))
+    verdict_cache.invalidate_problem(conn, problem_id)
+    catalog.bump(conn)
     conn.commit()
     conn.close()
     return redirect(url_for("admin_testcases", problem_id=problem_id))
 
 # ---------------------- User & Problem APIs ----------------------
-@app.route("/problems")
-def get_problems():
+# Catalog payloads come from catalog.payload_cache; browsers revalidate with If-None-Match and get a 304
+def catalog_response(key, build):
     conn = get_db_connection()
-    problems = conn.execute("SELECT * FROM problems").fetchall()
+    cached = catalog.payload(key, catalog.version(conn), lambda: build(conn))
     conn.close()
-    return jsonify([dict(row) for row in problems])
+    if cached is None:
+        return jsonify({"error": "Not found"}), 404
+    body, etag = cached
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route("/problems")
+def get_problems():
+    # the problem picker only needs these; full problems come from /problem/<id>
+    def build(conn):
+        rows = conn.execute("SELECT id, title, diff, tags FROM problems ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+    return catalog_response("problems", build)
+
+# what anyone may see of a problem; checker_code, expected outputs and test data refs are admin-only
+PUBLIC_PROBLEM_COLUMNS = ("id", "title", "description", "examples", "prefix", "constraints", "diff", "tags",
+                          "total_time_limit", "cpu_time_limit", "wall_time_limit", "memory_limit", "output_limit")
+PUBLIC_TEST_CASE_COLUMNS = ("id", "problem_id", "input", "input_size")
+
 
 @app.route("/problem/<int:id>")
 def get_problem(id):
-    conn = get_db_connection()
-    problem = conn.execute("SELECT * FROM problems WHERE id=?", (id,)).fetchone()
-    test_cases = conn.execute("SELECT * FROM test_cases WHERE problem_id=?", (id,)).fetchall()
-    conn.close()
- 
-    return jsonify({
-        "problem": dict(problem),
-        "test_cases": [dict(tc) for tc in test_cases]
-    })
+    admin = bool(getattr(current_user, "is_admin", 0))
+    problem_columns = "*" if admin else ", ".join(PUBLIC_PROBLEM_COLUMNS)
+    case_columns = "*" if admin else ", ".join(PUBLIC_TEST_CASE_COLUMNS)
+
+    def build(conn):
+        problem = conn.execute(f"SELECT {problem_columns} FROM problems WHERE id=?", (id,)).fetchone()
+        if problem is None:
+            return None
+        test_cases = conn.execute(f"SELECT {case_columns} FROM test_cases WHERE problem_id=?", (id,)).fetchall()
+        return {
+            "problem": dict(problem),
+            "test_cases": [dict(tc) for tc in test_cases]
+        }
+    return catalog_response(f"problem:{id}:{'admin' if admin else 'public'}", build)
 
 
 @app.route("/userHistory/<int:userID>")
@@ -664,344 +1093,46 @@ def userHistory(userID):
 
     # })
 
+# Everything the profile page shows in one request: ?fields= picks any of
+# user, stats, submissions, contributions (default all); ?limit= and ?year= as below.
+PROFILE_FIELDS = ("user", "stats", "submissions", "contributions")
+PROFILE_SUBMISSIONS = 20
+PROFILE_SUBMISSIONS_MAX = 100
 
-# ---------------------- Worker & Submission Queue ----------------------
-NUM_WORKERS = 3
-results_map = {}
-submission_queue = queue.Queue()
-worker_status = {}
-
-SANDBOX_DIR = "/home/lenovo/sandbox"
-DOCKER_IMAGE = "python-sandbox"
-
-def worker(worker_id,):
-    while True:
-        worker_status[worker_id] = "idle"
-        submission_id, user_code, problem_id, user_id = submission_queue.get()
-        worker_status[worker_id] = f"{submission_id}"
-        try:
-            result = run_submission(user_code, problem_id, submission_id, user_id)
-            results_map[submission_id] = result
-        except Exception as e:
-            results_map[submission_id] = [{"verdict": "Error", "error": str(e)}]
-        finally:
-            submission_queue.task_done()
-
-for i in range(NUM_WORKERS):
-    threading.Thread(target=worker, args=(i,), daemon=True).start()
-
-# ---------------------- Run Submission Logic ----------------------
-
-
-def run_submission(user_code, problem_id, submission_id, user_id):
-    temp_file = os.path.join(SANDBOX_DIR, f"temp_{submission_id}.py")
-
-    wrapped_code = f"""
-{user_code}
-if __name__ == "__main__":
-        import sys, json, io, contextlib, tracemalloc, time, traceback
-        start_time = time.perf_counter()
-        tracemalloc.start()
-        try:
-            args = json.loads(sys.argv[1])
-            
-            with io.StringIO() as buf, contextlib.redirect_stdout(buf):
-                returned_value = solution(*args)
-                printed_output = buf.getvalue()
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
-            end_time = time.perf_counter()
-            elapsed_time = end_time - start_time
-            print(json.dumps({{"return": returned_value, "printed": printed_output, "memory": peak // 1024, "runtime": round(elapsed_time*1000,1)}}))
-        except Exception as e:
-            end_time = time.perf_counter()
-            elapsed_time = end_time - start_time
-
-            error_msg = traceback.format_exc()[250:]
-            
-            
-
-            print(json.dumps({{"error": error_msg, "runtime": round(elapsed_time*1000,1)}}))
-    """
-
-    with open(temp_file, "w") as f:
-        f.write(wrapped_code)
-
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    test_cases = conn.execute(
-        "SELECT input, expected FROM test_cases WHERE problem_id=?", (problem_id,)
-    ).fetchall()
-    conn.close()
-
-    results = []
-
-
-    conn = get_db_connection()
-
-
-    conn.execute("""
-    INSERT INTO contributions (user_id, contribution_date, count)
-    VALUES (?, ?, 1)
-    ON CONFLICT(user_id, contribution_date)
-    DO UPDATE SET count = count + 1;
-    """, (user_id, datetime.today().strftime('%Y-%m-%d')))
-    print("=======================")
-    conn.commit()
-    conn.close()
-
-    for case in test_cases:
-        try:
-            args = json.loads(case["input"])
-            docker_cmd = [
-                "docker", "run", "--memory=100m",  "--rm",
-                "-v", f"{SANDBOX_DIR}:/app",
-                DOCKER_IMAGE,
-                "python3", f"/app/{os.path.basename(temp_file)}",
-                json.dumps(args)
-            ]
-            completed = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=5)
-
-            if completed.stdout:
-                stdout_lines = completed.stdout.strip().splitlines()
-            else:
-                stdout_lines = completed.stderr.strip().splitlines()
-            
-            
-            output_json = None
-
-            for line in stdout_lines:
-                try:
-                    output_json = json.loads(line)
-                    break
-                except json.JSONDecodeError:
-
-
-                    continue
-            print("=====================")
-            print(completed)
-
-            #Memory Limit Error
-            if completed.returncode == 137:
-                results.append({
-                    "input": args,
-                    "expected": json.loads(case["expected"]),
-                    "output": None,
-                    "printed": "",
-                    "verdict": "Memory Limit",
-                    "error": ""
-                })
-
-                databaseInsert = {"memory": "Exceeded", "runtime": 0.0}
-
-                conn = get_db_connection()
-                conn.execute(
-                    "UPDATE submissions SET status=?, memory=?, runtime=? WHERE UniqID = ?",
-                    ( "Memory Limit", databaseInsert["memory"], databaseInsert["runtime"], submission_id ))
-                
-                for submissionTestCase in results:
-                    print(submissionTestCase)
-                    conn.execute(
-                    "INSERT INTO testcaseSub (subID, input, expected, printed, output, verdict, error) VALUES(?, ?, ?, ?, ?, ?, ?)",
-                    ( submission_id, str(submissionTestCase["input"]), submissionTestCase["expected"], submissionTestCase["printed"], submissionTestCase["output"], submissionTestCase["verdict"],  submissionTestCase["error"])
-                    )
-
-
-                conn.commit()
-                conn.close()
-                return results
-
-
-            if not output_json:
-               
-                stdout_lines = " \n".join(stdout_lines)
-                output_json = {"error":stdout_lines[58:]}
-
-
-        
-            print(output_json)
-
-            if output_json is None:
-                results.append({
-                    "input": args,
-                    "expected": json.loads(case["expected"]),
-                    "output": "",
-                    "printed": "",
-                    "verdict": "Error",
-                    "error": "No JSON output"
-                })
-                continue
-
-            if "error" in output_json:
-                verdict = "Error"
-                returned_value = None
-                printed_output = ""
-                error_message = output_json["error"]
-
-                # error_message[5] = str(int() - 1)
-
-                if 'if __name__ == "__main__":' in error_message:
-                    error_message = "Please use 'return' to properly testcase your code"
-                else:
-                    error_message = error_message.replace(output_json["error"][5], str(int(output_json["error"][5]) - 1)) 
-                
-                results.append({
-                    "input": args,
-                    "expected": json.loads(case["expected"]),
-                    "output": returned_value,
-                    "printed": printed_output,
-                    "verdict": verdict,
-                    "error": error_message
-                })
-
-
-                databaseInsert = {"status": f'RunTime Error:\n{error_message}', "memory": 0, "runtime": 0.0}
-
-                conn = get_db_connection()
-                conn.execute(
-                    "UPDATE submissions SET status=?, memory=?, runtime=?, error=? WHERE UniqID = ?",
-                    ( "Error", databaseInsert["memory"], databaseInsert["runtime"], databaseInsert["status"], submission_id ))
-                
-                for submissionTestCase in results:
-                    print(submissionTestCase)
-                    conn.execute(
-                    "INSERT INTO testcaseSub (subID, input, expected, printed, output, verdict, error) VALUES(?, ?, ?, ?, ?, ?, ?)",
-                    ( submission_id, str(submissionTestCase["input"]), submissionTestCase["expected"], submissionTestCase["printed"], submissionTestCase["output"], submissionTestCase["verdict"],  submissionTestCase["error"])
-                    )
-
-
-                conn.commit()
-                conn.close()
-
-
-                file_to_delete = "../sandbox/temp_" + submission_id + ".py"
-                try:
-                    os.remove(file_to_delete)
-                    print(f"File '{file_to_delete}' deleted successfully.")
-                except FileNotFoundError:
-                    print(f"Error: File '{file_to_delete}' not found.")
-                except PermissionError:
-                    print(f"Error: Permission denied to delete '{file_to_delete}'.")
-                except Exception as e:
-                    print(f"An unexpected error occurred: {e}")
-                    # print(jsonify(results))
-
-                return results
-            else:
-                returned_value = output_json.get("return")
-                printed_output = output_json.get("printed", "")
-                expected_value = json.loads(case["expected"])
-                verdict = "correct" if returned_value == expected_value else "wrong"
-
-                error_message = ""
-
-            results.append({
-                "input": args,
-                "expected": json.loads(case["expected"]),
-                "output": returned_value,
-                "printed": printed_output,
-                "verdict": verdict,
-                "error": error_message
-            })
-        except subprocess.TimeoutExpired:
-
-            results.append({
-                "input": args,
-                "expected": json.loads(case["expected"]),
-                "output": "",
-                "printed": "",
-                "verdict": "Time Limit Exceeded",
-                "error": ""
-            })
-            print("===================================================")
-            print(results)
-            conn = get_db_connection()
-
-            conn.execute(
-            "UPDATE submissions SET status=?, memory=?, runtime=? WHERE UniqID = ?",
-            ( "Time Limit", "0.0", "", submission_id ))
-
-            for submissionTestCase in results:
-                conn.execute(
-                "INSERT INTO testcaseSub (subID, input, expected, printed, output, verdict, error) VALUES(?, ?, ?, ?, ?, ?, ?)",
-                ( submission_id, str(submissionTestCase["input"]), submissionTestCase["expected"], submissionTestCase["printed"], submissionTestCase["output"], submissionTestCase["verdict"],  submissionTestCase["error"])
-                )
-            
-
-            conn.commit()
-            conn.close()
-
-            file_to_delete = "../sandbox/temp_" + submission_id + ".py"
-            try:
-                os.remove(file_to_delete)
-                print(f"File '{file_to_delete}' deleted successfully.")
-            except FileNotFoundError:
-                print(f"Error: File '{file_to_delete}' not found.")
-            except PermissionError:
-                print(f"Error: Permission denied to delete '{file_to_delete}'.")
-            except Exception as e:
-                print(f"An unexpected error occurred: {e}")
-                # print(jsonify(results))
-
-            return results
-
-    databaseInsert = {"status": 'correct', "memory": 0, "runtime": 0.0}
-
-    for result in results:
-        if result["error"] != '':
-            databaseInsert["status"] = "Error"
-        elif result["verdict"] == "Time Limit Exceeded":
-            databaseInsert["status"] = "Time Limit"
-        elif result["verdict"] == "wrong":
-            databaseInsert["status"] = "wrong"
-
-
-            
-    # if databaseInsert["error"] == "Time Limit" or databaseInsert["error"] == "Error":
-    databaseInsert["memory"] = output_json["memory"]
-    databaseInsert["runtime"] = output_json["runtime"]
-        # ...
+@app.route("/profile_summary/<int:id>")
+@login_required
+def profile_summary(id):
+    fields = [f for f in request.args.get("fields", ",".join(PROFILE_FIELDS)).split(",") if f]
+    unknown = [f for f in fields if f not in PROFILE_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    limit = min(max(request.args.get("limit", PROFILE_SUBMISSIONS, type=int), 1), PROFILE_SUBMISSIONS_MAX)
+    year = request.args.get("year", datetime.now().year, type=int)
 
     conn = get_db_connection()
-
-
-
-    
-    conn.execute(
-        "UPDATE submissions SET status=?, memory=?, runtime=? WHERE UniqID = ?",
-        ( databaseInsert["status"], databaseInsert["memory"], databaseInsert["runtime"], submission_id ))
-    
-
-    
-
-
-    for submissionTestCase in results:
-        print(submissionTestCase)
-        conn.execute(
-        "INSERT INTO testcaseSub (subID, input, expected, printed, output, verdict, error) VALUES(?, ?, ?, ?, ?, ?, ?)",
-        ( submission_id, str(submissionTestCase["input"]), submissionTestCase["expected"], submissionTestCase["printed"], submissionTestCase["output"], submissionTestCase["verdict"],  submissionTestCase["error"])
-        )
-
-    
-    conn.commit()
+    user = conn.execute("SELECT id, username, email, imageFile FROM users WHERE id = ?", (id,)).fetchone()
+    if user is None:
+        conn.close()
+        return jsonify({"error": "User not found"}), 404
+    summary = {}
+    if "user" in fields:
+        summary["userData"] = dict(user)
+    if "stats" in fields:
+        summary["stats"] = dict(user_stats.stats(conn, id), total_problems=total_problems(conn))
+    if "submissions" in fields:
+        # problem title/difficulty joined in; code is left out, the list never shows it
+        rows = conn.execute("""
+            SELECT s.subID, s.problem_id, s.status, s.runtime, s.memory, s.language, s.subTime,
+                   p.title, p.diff
+            FROM submissions s LEFT JOIN problems p ON p.id = s.problem_id
+            WHERE s.userID = ? ORDER BY s.subTime DESC LIMIT ?
+        """, (id, limit)).fetchall()
+        summary["submissions"] = [dict(row) for row in rows]
+    if "contributions" in fields:
+        summary["contributions"] = {"year": year, "months": contributions_by_month(conn, id, year)}
     conn.close()
+    return jsonify(summary)
 
-    
-
-
-    # Deleting used submission file 
-    file_to_delete = "../sandbox/temp_" + submission_id + ".py"
-    try:
-        os.remove(file_to_delete)
-        print(f"File '{file_to_delete}' deleted successfully.")
-    except FileNotFoundError:
-        print(f"Error: File '{file_to_delete}' not found.")
-    except PermissionError:
-        print(f"Error: Permission denied to delete '{file_to_delete}'.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        # print(jsonify(results))
-    return results
 
 # ---------------------- Submission Routes ----------------------
 @login_required
@@ -1010,25 +1141,139 @@ def run_code():
     data = request.get_json()
     if not data or "code" not in data or "problem_id" not in data:
         return jsonify({"error": "Missing 'code' or 'problem_id'"}), 400
-    submission_id = str(uuid.uuid4())
+    # "submit" stops at the first failing test case, "run" reports all of them
+    mode = data.get("mode", "submit")
+    if mode not in judge.RUN_MODES:
+        return jsonify({"error": f"Unknown mode '{mode}'"}), 400
+    busy = queue_full_response()
+    if busy is not None:
+        return busy
     user_code = data["code"]
     problem_id = data["problem_id"]
     conn = get_db_connection()
-    conn.execute(
-        "INSERT INTO submissions (problem_id, code, UniqID, userID) VALUES (?, ?, ?, ?)",
-        (problem_id, user_code , submission_id , current_user.id))
-    
+    submission_id = store_submission(conn, problem_id, user_code, mode)
     conn.commit()
     conn.close()
-    submission_queue.put((submission_id, user_code, problem_id, current_user.id))
+    submission_count.add(1)
+    job_queue.enqueue(submission_id, user_code, problem_id, current_user.id, mode)
     return jsonify({"submission_id": submission_id})
 
+def queue_full_response():
+    # back-pressure: turn the submission away before it is stored when the judges can't keep up
+    # CPU comes from the background sampler, never from psutil in the request thread
+    sampler.start()
+    retry_after = judge.admission_delay(job_queue, cpu=sampler.cpu())
+    if retry_after is None:
+        return None
+    response = jsonify({"error": f"Queue full, retry in {retry_after} s", "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 503
+
+def store_submission(conn, problem_id, user_code, mode="submit"):
+    """Insert a Pending submissions row for current_user; returns its UniqID. Caller commits."""
+    submission_id = str(uuid.uuid4())
+    conn.execute(
+        "INSERT INTO submissions (problem_id, code, UniqID, userID, mode) VALUES (?, ?, ?, ?, ?)",
+        (problem_id, user_code, submission_id, current_user.id, mode))
+    return submission_id
+
+# Like the monitor stream, each open result stream holds a server thread: at most
+# RESULT_STREAM_MAX at once, the editor polls /result/<id> when it gets a 503
+RESULT_STREAM_TIMEOUT = 120
+RESULT_STREAM_POLL = 0.25
+RESULT_STREAM_MAX = 32
+result_streams = threading.BoundedSemaphore(RESULT_STREAM_MAX)
+
+# Finished results are kept in a bounded cache; older ones are rebuilt from submissions/testcaseSub
+RESULT_CACHE_SIZE = 1000
+RESULT_CACHE_TTL = 300
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def result_payload(job):
+    if job is None or job["status"] in ("queued", "running"):
+        return {"status": "pending"}
+    if job["status"] == "dead":
+        return {"status": "done", "results": [{"verdict": "Error", "error": job["error"]}]}
+    return {"status": "done", "results": json.loads(job["result"])}
+
+def stored_value(text):
+    # testcaseSub keeps inputs as str(list) and values as plain text
+    if not isinstance(text, str):
+        return text
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+def stored_result(submission_id):
+    conn = get_db_connection()
+    submission = conn.execute("SELECT status FROM submissions WHERE UniqID = ?", (submission_id,)).fetchone()
+    if submission is None or submission["status"] == "Pending":
+        conn.close()
+        return {"status": "pending"}
+    rows = conn.execute(
+        "SELECT input, expected, printed, output, verdict, error FROM testcaseSub WHERE subID = ? ORDER BY ID",
+        (submission_id,)
+    ).fetchall()
+    conn.close()
+    return {"status": "done", "results": [{
+        "input": stored_value(r["input"]),
+        "expected": stored_value(r["expected"]),
+        "output": stored_value(r["output"]),
+        "printed": r["printed"] or "",
+        "verdict": r["verdict"],
+        "error": r["error"] or ""
+    } for r in rows]}
+
+def lookup_result(submission_id):
+    payload = result_cache.get(submission_id)
+    if payload is not None:
+        return payload
+    job = job_queue.get(submission_id)
+    payload = result_payload(job) if job is not None else stored_result(submission_id)
+    if payload["status"] == "done":
+        result_cache.set(submission_id, payload)
+    return payload
+
+# Polling fallback for browsers without EventSource
 @app.route("/result/<submission_id>")
 def get_result(submission_id):
-    if submission_id not in results_map:
-        return jsonify({"status": "pending"})
-    return jsonify({"status": "done", "results": results_map[submission_id]})
+    return jsonify(lookup_result(submission_id))
+
+# Server-Sent Events: one "case" event per finished test case, then a "done" event with every result
+@app.route("/result/<submission_id>/stream")
+def stream_result(submission_id):
+    if not result_streams.acquire(blocking=False):
+        return jsonify({"error": "Too many result streams, poll /result/<id>"}), 503
+
+    def generate():
+        last_event_id = 0
+        deadline = time.time() + RESULT_STREAM_TIMEOUT
+        while time.time() < deadline:
+            for event_id, kind, payload in job_queue.events_since(submission_id, last_event_id):
+                last_event_id = event_id
+                yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+            payload = lookup_result(submission_id)
+            if payload["status"] == "done":
+                yield f"event: done\ndata: {json.dumps(payload)}\n\n"
+                return
+            job_queue.wait_for_events(RESULT_STREAM_POLL)
+        # the editor falls back to polling /result/<id> after this
+        yield "event: timeout\ndata: {}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(result_streams.release)
+    return response
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
+    # the debug reloader runs this file twice; only the serving child starts right away,
+    # so the monitoring page has history before anyone opens it
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()
     app.run(host="0.0.0.0", port=5001, debug=True)
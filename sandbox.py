@@ -0,0 +1,382 @@
+import json
+import os
+import queue
+import random
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+from metrics import stage_seconds
+from testdata import INPUTS_DIR, SANDBOX_DATA_DIR
+
+# ---------------------- Sandbox Settings ----------------------
+SANDBOX_DIR = "/home/lenovo/sandbox"
+DOCKER_IMAGE = "python-sandbox"
+# container-wide ceilings; the per-problem limits below are enforced per case by the harness
+MEMORY_LIMIT = "256m"
+PIDS_LIMIT = 64
+EXEC_TIMEOUT = 5
+# Containers run as an unprivileged uid of their own, picked from this range: the
+# harness's per-case "pids" limit (RLIMIT_NPROC) counts every process of the uid and
+# is not enforced at all for root
+SANDBOX_UID_BASE = 100000
+SANDBOX_UID_RANGE = 900000
+
+# Per-case limits when a problem doesn't set its own: CPU and wall seconds,
+# memory MB, processes, printed output KB
+DEFAULT_LIMITS = {"cpu": 2.0, "wall": 5.0, "memory": 100, "pids": 16, "output": 64}
+# problems columns holding the per-problem overrides
+LIMIT_COLUMNS = {"cpu": "cpu_time_limit", "wall": "wall_time_limit", "memory": "memory_limit",
+                 "pids": "pids_limit", "output": "output_limit"}
+# extra host-side wait per case on top of the wall limit, for harness startup
+WALL_GRACE = 2
+
+# Harness output is read in chunks and capped instead of buffered whole: one result
+# line (a case's JSON, including its return value) and the stderr of a run
+RESULT_LINE_LIMIT = 4 * 1024 * 1024
+STDERR_LIMIT = 64 * 1024
+READ_CHUNK = 64 * 1024
+TRUNCATION_MARKER = "\n... [output truncated, {} more bytes]"
+
+CONTAINERS_PER_WORKER = 1
+MAX_CONTAINER_USES = 50
+LEASE_TIMEOUT = 30
+CANCEL_POLL = 0.1
+
+
+HARNESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harness.py")
+HARNESS_PATH = "/app/harness.py"
+
+
+def docker_run_args():
+    uid = SANDBOX_UID_BASE + random.randrange(SANDBOX_UID_RANGE)
+    return ["--user", f"{uid}:{uid}", "--memory=" + MEMORY_LIMIT, "--memory-swap=" + MEMORY_LIMIT,
+            f"--pids-limit={PIDS_LIMIT}", "-v", f"{SANDBOX_DIR}:/app", "-v", f"{INPUTS_DIR}:{SANDBOX_DATA_DIR}:ro"]
+
+
+def case_limits(problem=None):
+    """DEFAULT_LIMITS overridden by whatever the problems row sets."""
+    limits = dict(DEFAULT_LIMITS)
+    if problem is not None:
+        for name, column in LIMIT_COLUMNS.items():
+            if column in problem.keys() and problem[column]:
+                limits[name] = problem[column]
+    return limits
+
+
+def install_harness():
+    # copy then rename so a running container never sees a half-written harness
+    tmp_path = os.path.join(SANDBOX_DIR, f".harness-{uuid.uuid4().hex}.py")
+    shutil.copyfile(HARNESS_FILE, tmp_path)
+    os.replace(tmp_path, os.path.join(SANDBOX_DIR, "harness.py"))
+
+
+def harness_cmd(script_name, limits=None):
+    return ["python3", HARNESS_PATH, f"/app/{script_name}", json.dumps(limits or DEFAULT_LIMITS)]
+
+
+# ---------------------- Cold Sandbox ----------------------
+class ColdSandbox:
+    """Old path: a brand-new `docker run --rm` container for every command."""
+
+    def __init__(self):
+        self.failed = False
+        self.name = None
+
+    def exec(self, cmd, timeout=EXEC_TIMEOUT):
+        docker_cmd = ["docker", "run", "--rm"] + docker_run_args() + [DOCKER_IMAGE] + cmd
+        return subprocess.run(docker_cmd, capture_output=True, text=True, timeout=timeout)
+
+    def popen(self, cmd):
+        self.name = f"sandbox-{uuid.uuid4().hex[:12]}"
+        docker_cmd = ["docker", "run", "-i", "--rm", "--name", self.name] + docker_run_args() + [DOCKER_IMAGE] + cmd
+        return subprocess.Popen(docker_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+    def stop(self):
+        # killing the docker client alone leaves the container running
+        if self.name:
+            subprocess.Popen(["docker", "kill", self.name],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# ---------------------- Warm Container Pool ----------------------
+class PooledContainer:
+    def __init__(self, container_id):
+        self.id = container_id
+        self.uses = 0
+        self.failed = False
+
+    def exec(self, cmd, timeout=EXEC_TIMEOUT):
+        self.uses += 1
+        try:
+            completed = subprocess.run(
+                ["docker", "exec", "-i", self.id] + cmd,
+                capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            # the process keeps running inside the container, so never hand it out again
+            self.failed = True
+            raise
+        if completed.returncode != 0:
+            self.failed = True
+        return completed
+
+    def popen(self, cmd):
+        self.uses += 1
+        return subprocess.Popen(["docker", "exec", "-i", self.id] + cmd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def stop(self):
+        # leftover processes are killed by the reset when the container goes back to the pool
+        pass
+
+
+class ContainerPool:
+    """Pre-started sandbox containers that workers lease, exec into and return."""
+
+    def __init__(self, size, max_uses=MAX_CONTAINER_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.live = 0
+        self.stats = {"created": 0, "recycled": 0, "leases": 0}
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for _ in range(self.size):
+            self._replace()
+
+    def _spawn(self):
+        name = f"sandbox-{uuid.uuid4().hex[:12]}"
+        docker_cmd = (["docker", "run", "-d", "--rm", "--name", name] + docker_run_args()
+                      + [DOCKER_IMAGE, "sleep", "infinity"])
+        with stage_seconds.time(stage="container_start"):
+            subprocess.run(docker_cmd, capture_output=True, text=True, check=True, timeout=60)
+        with self.lock:
+            self.live += 1
+        self.stats["created"] += 1
+        return PooledContainer(name)
+
+    def _replace(self):
+        try:
+            self.idle.put(self._spawn())
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"Sandbox container could not be started: {e}")
+
+    def _reset(self, container):
+        # kill everything except PID 1 and wipe scratch space before the next lease
+        completed = subprocess.run(
+            ["docker", "exec", container.id, "sh", "-c", "kill -9 -1 2>/dev/null; rm -rf /tmp/* 2>/dev/null; true"],
+            capture_output=True, text=True, timeout=EXEC_TIMEOUT
+        )
+        return completed.returncode == 0
+
+    def _destroy(self, container):
+        with self.lock:
+            self.live -= 1
+        subprocess.Popen(["docker", "rm", "-f", container.id],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def lease(self, timeout=LEASE_TIMEOUT):
+        self.start()
+        container = self.idle.get(timeout=timeout)
+        self.stats["leases"] += 1
+        return container
+
+    def try_lease(self):
+        """An idle container if there is one right now, else None; used to borrow extra slots."""
+        self.start()
+        try:
+            container = self.idle.get_nowait()
+        except queue.Empty:
+            return None
+        self.stats["leases"] += 1
+        return container
+
+    def release(self, container):
+        if self.live > self.size:
+            # the pool was shrunk while this one was out
+            self._destroy(container)
+            return
+        if not container.failed and container.uses < self.max_uses:
+            try:
+                if self._reset(container):
+                    self.idle.put(container)
+                    return
+            except subprocess.SubprocessError:
+                pass
+        self.stats["recycled"] += 1
+        self._destroy(container)
+        threading.Thread(target=self._replace, daemon=True).start()
+
+    def resize(self, size):
+        """Grow or shrink to `size` containers; extra ones are removed as they come back idle."""
+        grow = size - self.size
+        self.size = size
+        for _ in range(max(0, grow)):
+            threading.Thread(target=self._replace, daemon=True).start()
+        while self.live > self.size:
+            try:
+                self._destroy(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def shutdown(self):
+        while True:
+            try:
+                self._destroy(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class Lease:
+    """Context manager so a container always goes back to the pool, failed or not."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.container = None
+
+    def __enter__(self):
+        self.container = self.pool.lease()
+        return self.container
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.container.failed = True
+        self.pool.release(self.container)
+        return False
+
+
+# ---------------------- Batch Streaming ----------------------
+class CappedBuffer:
+    """Keeps the first `limit` bytes written to it and counts the rest."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = bytearray()
+        self.dropped = 0
+
+    def write(self, chunk):
+        room = self.limit - len(self.data)
+        if room > 0:
+            self.data += chunk[:room]
+        self.dropped += max(0, len(chunk) - max(room, 0))
+
+    def text(self):
+        text = self.data.decode(errors="replace")
+        return text + TRUNCATION_MARKER.format(self.dropped) if self.dropped else text
+
+
+def _feed(stream, lines):
+    try:
+        for line in lines:
+            stream.write(line.encode() + b"\n")
+        stream.close()
+    except (BrokenPipeError, OSError, ValueError):
+        pass
+
+
+def _read_lines(stream, sink, line_limit=RESULT_LINE_LIMIT):
+    # one CappedBuffer per line on `sink`, then None; a line never holds more than line_limit bytes
+    line = CappedBuffer(line_limit)
+    while True:
+        chunk = stream.read1(READ_CHUNK)
+        if not chunk:
+            break
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                line.write(chunk[start:])
+                break
+            line.write(chunk[start:end])
+            sink.put(line)
+            line = CappedBuffer(line_limit)
+            start = end + 1
+    if line.data or line.dropped:
+        sink.put(line)
+    sink.put(None)
+
+
+def _capture(stream, buffer):
+    # keep draining past the cap so the process never blocks on a full pipe
+    while True:
+        chunk = stream.read1(READ_CHUNK)
+        if not chunk:
+            break
+        buffer.write(chunk)
+
+
+def stream_cases(box, cmd, inputs, timeout=EXEC_TIMEOUT, deadline=None, cancel=None):
+    """Start the batch harness once and yield its per-case JSON results as they arrive.
+
+    Every case gets `timeout` seconds, and no case may run past `deadline` (a
+    time.monotonic() value); when either runs out the box is marked failed and
+    subprocess.TimeoutExpired is raised. If the process dies before answering every
+    case, a final {"exit": returncode, "output": ...} entry carries its stderr.
+    Closing the generator early, or setting the `cancel` event, stops the process.
+
+    stdout is the harness's result channel: every line is one case's JSON. A line
+    over RESULT_LINE_LIMIT is answered as an output limit for that case; stderr is
+    kept up to STDERR_LIMIT bytes.
+    """
+    proc = box.popen(cmd)
+    lines = queue.Queue()
+    stderr = CappedBuffer(STDERR_LIMIT)
+    threading.Thread(target=_feed, args=(proc.stdin, inputs), daemon=True).start()
+    threading.Thread(target=_read_lines, args=(proc.stdout, lines), daemon=True).start()
+    stderr_reader = threading.Thread(target=_capture, args=(proc.stderr, stderr), daemon=True)
+    stderr_reader.start()
+    answered = 0
+    noise = CappedBuffer(STDERR_LIMIT)
+    try:
+        case_deadline = time.monotonic() + timeout
+        while True:
+            limit = case_deadline if deadline is None else min(case_deadline, deadline)
+            try:
+                # with a cancel event, wake up regularly to look at it
+                wait = limit - time.monotonic()
+                line = lines.get(timeout=max(0, min(wait, CANCEL_POLL) if cancel is not None else wait))
+            except queue.Empty:
+                if cancel is not None and cancel.is_set():
+                    return
+                if time.monotonic() < limit:
+                    continue
+                box.failed = True
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if line is None:
+                break
+            if line.dropped:
+                result = {"case": answered, "limit": "output"}
+            else:
+                try:
+                    result = json.loads(line.data)
+                except ValueError:
+                    result = None
+            if isinstance(result, dict) and "case" in result:
+                answered += 1
+                case_deadline = time.monotonic() + timeout
+                yield result
+                if cancel is not None and cancel.is_set():
+                    return
+            else:
+                # nothing but the harness writes here; keep it for the error report
+                noise.write(bytes(line.data) + b"\n")
+
+        returncode = proc.wait(timeout=timeout)
+        if returncode != 0 or answered < len(inputs):
+            box.failed = True
+            stderr_reader.join(timeout)
+            yield {"exit": returncode, "output": noise.text() + stderr.text()}
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            box.stop()
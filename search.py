@@ -0,0 +1,139 @@
+import re
+
+from cache import TTLCache
+
+# ---------------------- Problem Search Index ----------------------
+# FTS5 table over problem title, description and tags, rowid = problems.id.
+# unicode61 folds case for Cyrillic too (LOWER() only folds ASCII), and diacritics
+# are kept so й/и and ё/е stay different words.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+TAGS_WEIGHT = 5.0
+
+
+def init_search_index(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'problems_fts'").fetchone()
+    if not exists:
+        conn.execute(
+            "CREATE VIRTUAL TABLE problems_fts USING fts5("
+            "title, description, tags, tokenize = 'unicode61 remove_diacritics 0')"
+        )
+        conn.execute(
+            "INSERT INTO problems_fts (problems_fts, rank) VALUES ('rank', ?)",
+            (f"bm25({TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {TAGS_WEIGHT})",)
+        )
+        rebuild_search_index(conn)
+    conn.commit()
+
+
+def rebuild_search_index(conn):
+    conn.execute("DELETE FROM problems_fts")
+    conn.execute(
+        "INSERT INTO problems_fts (rowid, title, description, tags) "
+        "SELECT id, IFNULL(title, ''), IFNULL(description, ''), IFNULL(tags, '') FROM problems"
+    )
+
+
+def index_problem(conn, problem_id):
+    """Re-index one problem after it was added or edited; caller commits."""
+    conn.execute("DELETE FROM problems_fts WHERE rowid = ?", (problem_id,))
+    conn.execute(
+        "INSERT INTO problems_fts (rowid, title, description, tags) "
+        "SELECT id, IFNULL(title, ''), IFNULL(description, ''), IFNULL(tags, '') FROM problems WHERE id = ?",
+        (problem_id,)
+    )
+
+
+def unindex_problem(conn, problem_id):
+    conn.execute("DELETE FROM problems_fts WHERE rowid = ?", (problem_id,))
+
+
+def match_query(q, columns=None):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    query = " ".join(f'"{w}"*' for w in words)
+    if columns:
+        query = "{" + " ".join(columns) + "} : (" + query + ")"
+    return query
+
+
+def search_join(match):
+    """JOIN clause limiting `problems` to index hits; exposes hits.fts_rank for ORDER BY."""
+    return (
+        "JOIN (SELECT rowid AS fts_id, rank AS fts_rank FROM problems_fts WHERE problems_fts MATCH ?) AS hits "
+        "ON hits.fts_id = problems.id",
+        [match],
+    )
+
+
+# ---------------------- Problem Tags ----------------------
+# problem_tags is the many-to-many problem <-> topic table the topic filters use.
+# problems.tags keeps the comma separated string for display and the search index.
+TOPIC_COUNTS_TTL = 300
+topic_cache = TTLCache(maxsize=1, ttl=TOPIC_COUNTS_TTL)
+
+
+def init_tag_table(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'problem_tags'").fetchone()
+    if not exists:
+        conn.execute(
+            "CREATE TABLE problem_tags ("
+            "problem_id INTEGER NOT NULL, tag TEXT NOT NULL COLLATE NOCASE, "
+            "PRIMARY KEY (problem_id, tag)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX idx_problem_tags_tag ON problem_tags (tag, problem_id)")
+        # move the existing tag strings over
+        for row in conn.execute("SELECT id, tags FROM problems").fetchall():
+            set_problem_tags(conn, row[0], row[1])
+    conn.commit()
+
+
+def split_tags(text):
+    """'Array, love,Array' -> ['Array', 'love']; duplicates are dropped case-insensitively."""
+    tags = []
+    seen = set()
+    for tag in (text or "").split(","):
+        tag = tag.strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    return tags
+
+
+def set_problem_tags(conn, problem_id, text):
+    """Replace a problem's tags with the ones in `text`; caller commits."""
+    conn.execute("DELETE FROM problem_tags WHERE problem_id = ?", (problem_id,))
+    conn.executemany(
+        "INSERT INTO problem_tags (problem_id, tag) VALUES (?, ?)",
+        [(problem_id, tag) for tag in split_tags(text)]
+    )
+    topic_cache.clear()
+
+
+def remove_problem_tags(conn, problem_id):
+    conn.execute("DELETE FROM problem_tags WHERE problem_id = ?", (problem_id,))
+    topic_cache.clear()
+
+
+def topic_filter(topics):
+    """WHERE clause matching problems tagged with any of `topics` (exact, case-insensitive)."""
+    marks = ", ".join("?" for _ in topics)
+    return f"id IN (SELECT problem_id FROM problem_tags WHERE tag IN ({marks}))", list(topics)
+
+
+def topic_counts(conn):
+    """[{"tag", "count"}] for every topic in use, most used first; cached until tags change."""
+    counts = topic_cache.get("counts")
+    if counts is None:
+        rows = conn.execute(
+            "SELECT MIN(tag) AS tag, COUNT(*) AS count FROM problem_tags "
+            "GROUP BY tag ORDER BY count DESC, tag"
+        ).fetchall()
+        counts = [{"tag": r["tag"], "count": r["count"]} for r in rows]
+        topic_cache.set("counts", counts)
+    return counts
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+# ---------------------- Test Data Files ----------------------
+# Test case inputs or expected outputs over INLINE_LIMIT bytes are kept out of
+# ProblemDB.db: the text goes to TESTDATA_DIR/inputs/<ab>/<sha256> or
+# TESTDATA_DIR/expected/<ab>/<sha256>, written once per distinct content, and
+# test_cases holds only the hash (input_ref/expected_ref) and the size. Only
+# INPUTS_DIR is mounted read-only at SANDBOX_DATA_DIR, where the harness maps the
+# files instead of receiving the data on stdin; expected outputs stay on the host.
+TESTDATA_DIR = os.environ.get("TESTDATA_DIR", "/home/lenovo/testdata")
+INPUTS_DIR = os.path.join(TESTDATA_DIR, "inputs")
+EXPECTED_DIR = os.path.join(TESTDATA_DIR, "expected")
+SANDBOX_DATA_DIR = "/data"
+INLINE_LIMIT = 64 * 1024
+
+
+def blob_name(ref):
+    return f"{ref[:2]}/{ref}"
+
+
+def blob_path(ref, name):
+    return os.path.join(INPUTS_DIR if name == "input" else EXPECTED_DIR, blob_name(ref))
+
+
+def sandbox_path(ref):
+    return f"{SANDBOX_DATA_DIR}/{blob_name(ref)}"
+
+
+def store(text, name):
+    """Write `text` as an input/expected blob under its content hash unless it is there already; returns (ref, size)."""
+    data = text.encode()
+    ref = hashlib.sha256(data).hexdigest()
+    path = blob_path(ref, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a half-written file is never visible under its hash
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return ref, len(data)
+
+
+def read(ref, name):
+    with open(blob_path(ref, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def case_columns(input_data, expected_output):
+    """test_cases column values for a case, moving large parts to files."""
+    columns = {}
+    for name, text in (("input", input_data), ("expected", expected_output)):
+        if len(text.encode()) > INLINE_LIMIT:
+            ref, size = store(text, name)
+            columns.update({name: "", f"{name}_ref": ref, f"{name}_size": size})
+        else:
+            columns.update({name: text, f"{name}_ref": None, f"{name}_size": None})
+    return columns
+
+
+def case_text(case, name):
+    """The full input/expected text of a test_cases row, inline or from its file."""
+    ref = case[f"{name}_ref"]
+    return read(ref, name) if ref else case[name]
+
+
+def move_large_cases(conn):
+    """Move inline inputs/expected outputs over INLINE_LIMIT to files; caller commits."""
+    rows = conn.execute(
+        "SELECT id, input, expected FROM test_cases WHERE length(CAST(input AS BLOB)) > ? "
+        "OR length(CAST(expected AS BLOB)) > ?", (INLINE_LIMIT, INLINE_LIMIT)
+    ).fetchall()
+    for row in rows:
+        columns = case_columns(row["input"], row["expected"])
+        conn.execute(
+            f"UPDATE test_cases SET {', '.join(f'{c}=?' for c in columns)} WHERE id=?",
+            (*columns.values(), row["id"])
+        )
+    return len(rows)
+
+
+def split_blobs(conn):
+    """Move blobs of the old single-directory layout (TESTDATA_DIR/<ab>/<sha256>, all of
+    it mounted in the sandbox) to INPUTS_DIR/EXPECTED_DIR by what the test cases use them for."""
+    moved = set()
+    for name in ("input", "expected"):
+        refs = conn.execute(f"SELECT DISTINCT {name}_ref FROM test_cases WHERE {name}_ref IS NOT NULL").fetchall()
+        for (ref,) in refs:
+            old_path = os.path.join(TESTDATA_DIR, blob_name(ref))
+            path = blob_path(ref, name)
+            if os.path.exists(path) or not os.path.exists(old_path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(old_path, tmp_path)
+            os.replace(tmp_path, path)
+            moved.add(old_path)
+    # removed only once every copy is made: one blob can be both an input and an expected output
+    for old_path in moved:
+        os.remove(old_path)
+    return len(moved)
@@ -0,0 +1,22 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# nothing under test may touch the real ProblemDB.db
+os.environ["DB_PATH"] = os.path.join(ROOT, "tests", ".unused.db")
+
+
+@pytest.fixture
+def connect(tmp_path):
+    """A connection factory for a fresh database file, like db.get_db_connection."""
+    path = str(tmp_path / "test.db")
+
+    def factory():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return factory
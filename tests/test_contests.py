@@ -0,0 +1,39 @@
+import bisect
+import random
+
+from contests import RankedList
+
+
+def test_ranked_list_matches_a_sorted_list():
+    rng = random.Random(1)
+    ranked, reference = RankedList(), []
+    for step in range(3000):
+        if reference and rng.random() < 0.4:
+            value = reference[rng.randrange(len(reference))]
+            ranked.remove(value)
+            reference.remove(value)
+        else:
+            # ties are broken the way Standing.key() does, so values are unique
+            value = (rng.randrange(50), step)
+            ranked.insert(value)
+            bisect.insort(reference, value)
+        assert len(ranked) == len(reference)
+        if step % 100 == 0:
+            assert ranked.slice(0, len(reference) + 5) == reference
+    for _ in range(200):
+        probe = (rng.randrange(50), rng.randrange(3000))
+        assert ranked.rank(probe) == bisect.bisect_left(reference, probe)
+    for start in (0, 1, len(reference) // 2, len(reference) - 1, len(reference)):
+        assert ranked.slice(start, 10) == reference[start:start + 10]
+
+
+def test_remove_of_a_missing_value_raises():
+    ranked = RankedList()
+    ranked.insert((1, 1))
+    try:
+        ranked.remove((2, 2))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("remove() accepted a value that is not in the list")
+    assert ranked.slice(0, 5) == [(1, 1)]
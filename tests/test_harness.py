@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+HARNESS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "harness.py")
+LIMITS = {"cpu": 2.0, "wall": 5.0, "memory": 200, "output": 64}
+
+
+def run_harness(tmp_path, code, cases):
+    solution = tmp_path / "solution.py"
+    solution.write_text(code)
+    completed = subprocess.run(
+        [sys.executable, HARNESS, str(solution), json.dumps(LIMITS)],
+        input="\n".join(json.dumps(args) for args in cases), capture_output=True, text=True, timeout=30
+    )
+    return [json.loads(line) for line in completed.stdout.splitlines()]
+
+
+def test_every_case_gets_a_result(tmp_path):
+    results = run_harness(tmp_path, "def solution(a, b):\n    return a * b\n", [[2, 3], [4, 5], [0, 1]])
+    assert [(r["case"], r["return"]) for r in results] == [(0, 6), (1, 20), (2, 0)]
+
+
+def test_load_failure_is_reported_for_every_case(tmp_path):
+    for code, message in (("def solution(a, b)\n    return a\n", "SyntaxError"),
+                          ("raise ValueError('at import')\ndef solution(a, b):\n    return a\n", "ValueError")):
+        results = run_harness(tmp_path, code, [[1, 2], [3, 4], [5, 6]])
+        assert [r["case"] for r in results] == [0, 1, 2]
+        assert all(message in r["error"] for r in results)
+
+
+def test_a_failing_case_does_not_stop_the_next_ones(tmp_path):
+    code = "def solution(a, b):\n    if a == 1:\n        return {a}\n    if a == 2:\n        return 1 // 0\n    return a\n"
+    results = run_harness(tmp_path, code, [[1, 0], [2, 0], [3, 0]])
+    assert [r["case"] for r in results] == [0, 1, 2]
+    assert "not JSON serializable" in results[0]["error"]
+    assert "ZeroDivisionError" in results[1]["error"]
+    assert results[2]["return"] == 3
@@ -0,0 +1,65 @@
+import judge_queue
+from judge_queue import MAX_ATTEMPTS, SQLiteJobQueue
+
+
+def make_queue(connect, monkeypatch):
+    monkeypatch.setattr(judge_queue, "RETRY_DELAY", 0)
+    return SQLiteJobQueue(connect=connect)
+
+
+def attempts(connect, job_id):
+    return connect().execute("SELECT attempts FROM judge_jobs WHERE id=?", (job_id,)).fetchone()[0]
+
+
+def test_lease_hands_out_a_job_once(connect, monkeypatch):
+    jobs = make_queue(connect, monkeypatch)
+    jobs.enqueue("s1", "code", 1, 7)
+    job = jobs.lease("worker-a")
+    assert job["id"] == "s1"
+    assert jobs.lease("worker-b") is None
+
+
+def test_expired_lease_is_retried_by_another_worker(connect, monkeypatch):
+    jobs = make_queue(connect, monkeypatch)
+    jobs.enqueue("s1", "code", 1, 7)
+    # a lease of 0 seconds has run out by the next lease call
+    assert jobs.lease("worker-a", lease_seconds=0)["id"] == "s1"
+    job = jobs.lease("worker-b")
+    assert job["id"] == "s1"
+    assert attempts(connect, "s1") == 2
+    # the first worker lost the job: its late result is ignored
+    jobs.complete("s1", "worker-a", {"status": "done"})
+    assert jobs.get("s1")["status"] == "running"
+    jobs.complete("s1", "worker-b", {"status": "done"})
+    assert jobs.get("s1")["status"] == "done"
+
+
+def test_extend_keeps_the_lease(connect, monkeypatch):
+    jobs = make_queue(connect, monkeypatch)
+    jobs.enqueue("s1", "code", 1, 7)
+    jobs.lease("worker-a", lease_seconds=0)
+    jobs.extend("worker-a")
+    assert jobs.lease("worker-b") is None
+
+
+def test_job_dies_after_max_attempts_of_expired_leases(connect, monkeypatch):
+    jobs = make_queue(connect, monkeypatch)
+    jobs.enqueue("s1", "code", 1, 7)
+    for attempt in range(MAX_ATTEMPTS):
+        assert jobs.lease(f"worker-{attempt}", lease_seconds=0)["id"] == "s1"
+    assert jobs.lease("worker-last") is None
+    assert jobs.get("s1")["status"] == "dead"
+
+
+def test_failed_job_is_requeued_then_dead(connect, monkeypatch):
+    jobs = make_queue(connect, monkeypatch)
+    jobs.enqueue("s1", "code", 1, 7)
+    for attempt in range(1, MAX_ATTEMPTS):
+        jobs.lease("worker")
+        jobs.fail("s1", "worker", "boom")
+        assert jobs.get("s1")["status"] == "queued"
+    jobs.lease("worker")
+    jobs.fail("s1", "worker", "boom")
+    job = jobs.get("s1")
+    assert job["status"] == "dead"
+    assert job["error"] == "boom"
@@ -0,0 +1,50 @@
+import judge
+import verdict_cache
+
+PROBLEM = {"id": 1, "exec_policy": "sequential", "total_time_limit": None, "cpu_time_limit": None,
+           "wall_time_limit": None, "memory_limit": None, "pids_limit": None, "output_limit": None,
+           "checker": "exact", "checker_arg": None, "checker_code": None}
+TEST_CASES = [{"input": "[1, 2]", "expected": "3", "input_ref": None, "expected_ref": None}]
+CODE = "def solution(a, b):\n    return a + b\n"
+
+
+def key(mode="submit", **changes):
+    policy = judge.execution_policy(dict(PROBLEM, **changes), mode)
+    return judge.verdict_key(mode, policy, 1, CODE, TEST_CASES)
+
+
+def test_same_inputs_give_the_same_key():
+    assert key() == key()
+    # whitespace-only edits don't change what the code does
+    policy = judge.execution_policy(PROBLEM, "submit")
+    assert judge.verdict_key("submit", policy, 1, CODE.replace("\n", "  \r\n"), TEST_CASES) == key()
+
+
+def test_checker_is_part_of_the_key():
+    keys = {key(), key(checker="float"), key(checker="float", checker_arg="0.1"), key(checker="tokens"),
+            key(checker="custom", checker_code="def check(a, r, e):\n    return True\n"),
+            key(checker="custom", checker_code="def check(a, r, e):\n    return False\n")}
+    assert len(keys) == 6
+
+
+def test_limits_are_part_of_the_key():
+    keys = {key(), key(cpu_time_limit=1.0), key(wall_time_limit=9.0), key(memory_limit=64), key(pids_limit=4),
+            key(output_limit=1), key(total_time_limit=5), key(exec_policy="parallel")}
+    assert len(keys) == 8
+
+
+def test_mode_and_test_cases_are_part_of_the_key():
+    policy = judge.execution_policy(PROBLEM, "submit")
+    other_cases = [dict(TEST_CASES[0], expected="4")]
+    assert key("run") != key()
+    assert judge.verdict_key("submit", policy, 1, CODE, other_cases) != key()
+
+
+def test_lookups_only_find_their_own_key(connect):
+    conn = connect()
+    verdict_cache.init_verdict_cache(conn)
+    verdict_cache.store(conn, key(), 1, "correct", 1, 2, [{"verdict": "correct"}])
+    conn.commit()
+    assert verdict_cache.lookup(conn, key())["status"] == "correct"
+    assert verdict_cache.lookup(conn, key(cpu_time_limit=0.5)) is None
+    assert verdict_cache.lookup(conn, key(checker="tokens")) is None
@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+
+# ---------------------- User Statistics ----------------------
+# Per-user counters kept up to date by result_store.write_result, in the same
+# transaction as the verdict, so profile reads are single-row lookups instead of
+# scans over submissions. user_solved remembers which problems a user has already
+# solved, so a second accepted submission doesn't count twice. Days with any
+# verdict are the contributions rows; the streak counts consecutive such days.
+ACCEPTED_STATUSES = ("correct",)
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+def init_user_stats(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        solved INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        accepted INTEGER NOT NULL DEFAULT 0,
+        solved_easy INTEGER NOT NULL DEFAULT 0,
+        solved_medium INTEGER NOT NULL DEFAULT 0,
+        solved_hard INTEGER NOT NULL DEFAULT 0,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        last_active TEXT
+    );
+    CREATE TABLE IF NOT EXISTS user_solved (
+        user_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        solved_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, problem_id)
+    ) WITHOUT ROWID;
+    """)
+    # first start with the table: fill it from the submissions judged so far
+    if conn.execute("SELECT 1 FROM user_stats LIMIT 1").fetchone() is None:
+        rebuild(conn)
+    conn.commit()
+
+
+def is_accepted(status):
+    return (status or "").lower() in ACCEPTED_STATUSES
+
+
+def difficulty_column(diff):
+    diff = (diff or "").lower()
+    return f"solved_{diff}" if diff in DIFFICULTIES else None
+
+
+def next_streak(last_active, current, day):
+    """The streak after activity on `day` (ISO date), given the last active day and the streak then."""
+    if last_active == day:
+        return current
+    if last_active == (date.fromisoformat(day) - timedelta(days=1)).isoformat():
+        return current + 1
+    return 1
+
+
+def record(conn, user_id, problem_id, status, day, attempt=True):
+    """Count one judged submission of `user_id` on `day`; caller commits.
+
+    attempt=False (a "run" of the sample cases) only keeps the streak going.
+    """
+    if user_id is None:
+        return
+    conn.execute("INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)", (user_id,))
+    row = conn.execute(
+        "SELECT last_active, current_streak, longest_streak FROM user_stats WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    streak = next_streak(row["last_active"], row["current_streak"], day)
+    updates = {
+        "current_streak": streak,
+        "longest_streak": max(row["longest_streak"], streak),
+        "last_active": max(row["last_active"] or day, day),
+    }
+    increments = []
+    if attempt:
+        increments.append("attempts")
+        if is_accepted(status):
+            increments.append("accepted")
+            newly_solved = conn.execute(
+                "INSERT OR IGNORE INTO user_solved (user_id, problem_id, solved_at) VALUES (?, ?, ?)",
+                (user_id, problem_id, day)
+            ).rowcount == 1
+            if newly_solved:
+                increments.append("solved")
+                diff = conn.execute("SELECT diff FROM problems WHERE id = ?", (problem_id,)).fetchone()
+                column = difficulty_column(diff["diff"] if diff else None)
+                if column:
+                    increments.append(column)
+    assignments = [f"{c} = ?" for c in updates] + [f"{c} = {c} + 1" for c in increments]
+    conn.execute(f"UPDATE user_stats SET {', '.join(assignments)} WHERE user_id = ?",
+                 (*updates.values(), user_id))
+
+
+def stats(conn, user_id, today=None):
+    """The stats row of a user as a dict, zeros if they have none yet."""
+    row = conn.execute("SELECT * FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+    result = dict(row) if row else {
+        "user_id": user_id, "solved": 0, "attempts": 0, "accepted": 0, "solved_easy": 0, "solved_medium": 0,
+        "solved_hard": 0, "current_streak": 0, "longest_streak": 0, "last_active": None,
+    }
+    # the stored streak is as of the last active day; a missed day since then ends it
+    today = today or date.today()
+    if result["last_active"] is None or result["last_active"] < (today - timedelta(days=1)).isoformat():
+        result["current_streak"] = 0
+    result["acceptance_rate"] = round(result["accepted"] / result["attempts"], 4) if result["attempts"] else 0.0
+    return result
+
+
+def rebuild(conn):
+    """Recompute user_stats and user_solved from submissions and contributions; caller commits.
+
+    Like record(), only "submit" submissions count as attempts; runs only show up in
+    the streak, through contributions. Rows from before submissions.mode count as submits.
+    """
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("DELETE FROM user_solved")
+    conn.execute("""
+    INSERT INTO user_solved (user_id, problem_id, solved_at)
+    SELECT userID, problem_id, MIN(date(subTime)) FROM submissions
+    WHERE userID IS NOT NULL AND mode = 'submit' AND lower(status) IN ({})
+    GROUP BY userID, problem_id
+    """.format(", ".join("?" * len(ACCEPTED_STATUSES))), ACCEPTED_STATUSES)
+    conn.execute("""
+    INSERT INTO user_stats (user_id, attempts, accepted)
+    SELECT userID, COUNT(*), SUM(lower(status) IN ({})) FROM submissions
+    WHERE userID IS NOT NULL AND mode = 'submit' AND status != 'Pending'
+    GROUP BY userID
+    """.format(", ".join("?" * len(ACCEPTED_STATUSES))), ACCEPTED_STATUSES)
+    conn.execute("INSERT OR IGNORE INTO user_stats (user_id) SELECT DISTINCT user_id FROM contributions")
+    conn.execute("""
+    UPDATE user_stats SET
+        solved = (SELECT COUNT(*) FROM user_solved s WHERE s.user_id = user_stats.user_id),
+        {}
+    """.format(",\n        ".join(
+        f"solved_{d} = (SELECT COUNT(*) FROM user_solved s JOIN problems p ON p.id = s.problem_id "
+        f"WHERE s.user_id = user_stats.user_id AND lower(p.diff) = '{d}')" for d in DIFFICULTIES
+    )))
+    # streaks: walk each user's active days in order
+    last = {}
+    for row in conn.execute(
+        "SELECT user_id, contribution_date FROM contributions WHERE count > 0 ORDER BY user_id, contribution_date"
+    ).fetchall():
+        user_id, day = row["user_id"], row["contribution_date"]
+        last_active, current, longest = last.get(user_id, (None, 0, 0))
+        current = next_streak(last_active, current, day)
+        last[user_id] = (day, current, max(longest, current))
+    conn.executemany(
+        "UPDATE user_stats SET last_active = ?, current_streak = ?, longest_streak = ? WHERE user_id = ?",
+        [(*values, user_id) for user_id, values in last.items()]
+    )
+
+
+def calendar(conn, user_id, start, end):
+    """[[ISO date, count]] of the days between start and end (inclusive) with any contribution."""
+    rows = conn.execute(
+        "SELECT contribution_date, count FROM contributions WHERE user_id = ? "
+        "AND contribution_date >= ? AND contribution_date <= ? ORDER BY contribution_date",
+        (user_id, start.isoformat(), end.isoformat())
+    ).fetchall()
+    return [[row["contribution_date"], row["count"]] for row in rows]
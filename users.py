@@ -0,0 +1,72 @@
+import os
+
+from cache import TTLCache
+from db import get_db_connection
+
+# ---------------------- User Model ----------------------
+# What Flask-Login keeps as current_user. The fields are fixed, so the object is a
+# plain __slots__ class; password_hash stays in the DB and is only read at login.
+USER_FIELDS = ("id", "username", "email", "is_admin", "pro", "streak", "imageFile")
+
+
+class User:
+    __slots__ = USER_FIELDS
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, **fields):
+        for name in USER_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_row(cls, row):
+        if not row:
+            return None
+        keys = row.keys()
+        return cls(**{name: row[name] for name in USER_FIELDS if name in keys})
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f"<User {self.id} {self.username!r}>"
+
+
+# ---------------------- User Cache ----------------------
+# load_user runs on every authenticated request; users are kept here for
+# USER_CACHE_TTL seconds so most requests skip the DB. Routes that change a user
+# (profile edits, the admin flag) call forget(); the TTL bounds how stale a change
+# made outside the app can be. USER_CACHE_TTL=0 turns the cache off.
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = 4096
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def load(user_id):
+    """The User for `user_id` (as stored in the session), or None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    if USER_CACHE_TTL > 0:
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+    conn = get_db_connection()
+    row = conn.execute(f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    user = User.from_row(row)
+    if user is not None:
+        remember(user)
+    return user
+
+
+def remember(user):
+    if USER_CACHE_TTL > 0:
+        user_cache.set(user.id, user)
+
+
+def forget(user_id):
+    user_cache.pop(int(user_id))
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import time
+
+# ---------------------- Verdict Cache ----------------------
+# Finished verdicts keyed on (problem, normalized code, test case fingerprint).
+# The fingerprint hashes the problem's test_cases rows, so editing a test case
+# changes every key for that problem; the admin test case routes also drop the
+# stale rows right away. Stored in the DB so the web app and standalone judge
+# processes share it.
+MAX_ENTRIES = 5000
+# verdicts that depend on machine load are judged again instead of cached
+CACHEABLE_STATUSES = ("correct", "wrong")
+
+
+def init_verdict_cache(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS verdict_cache (
+        key TEXT PRIMARY KEY,
+        problem_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        memory REAL,
+        runtime REAL,
+        results TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_verdict_cache_problem ON verdict_cache (problem_id);
+    CREATE INDEX IF NOT EXISTS idx_verdict_cache_created ON verdict_cache (created_at);
+    CREATE TABLE IF NOT EXISTS verdict_cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO verdict_cache_stats (id) VALUES (1);
+    """)
+    conn.commit()
+
+
+def normalize_code(code):
+    # line endings and trailing whitespace don't change what the code does
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def test_fingerprint(test_cases):
+    # file-backed inputs/expected outputs are already named by their content hash
+    digest = hashlib.sha256()
+    for case in test_cases:
+        digest.update((case["input_ref"] or case["input"]).encode())
+        digest.update(b"\0")
+        digest.update((case["expected_ref"] or case["expected"]).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_key(problem_id, code, test_cases, fingerprint=None):
+    digest = hashlib.sha256(normalize_code(code).encode()).hexdigest()
+    return f"{problem_id}:{digest}:{fingerprint or test_fingerprint(test_cases)}"
+
+
+def lookup(conn, key):
+    """Cached entry for `key` as a dict (results decoded), or None. Read-only; see count_lookup()."""
+    row = conn.execute(
+        "SELECT status, memory, runtime, results FROM verdict_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "status": row["status"],
+        "memory": row["memory"],
+        "runtime": row["runtime"],
+        "results": json.loads(row["results"]),
+    }
+
+
+def count_lookup(conn, key, hit):
+    """Count a lookup's hit or miss; result_store does it in the transaction that saves the result. Caller commits."""
+    if hit:
+        conn.execute("UPDATE verdict_cache SET hits = hits + 1 WHERE key = ?", (key,))
+        conn.execute("UPDATE verdict_cache_stats SET hits = hits + 1 WHERE id = 1")
+    else:
+        conn.execute("UPDATE verdict_cache_stats SET misses = misses + 1 WHERE id = 1")
+
+
+def store(conn, key, problem_id, status, memory, runtime, results):
+    """Remember a verdict; caller commits."""
+    if status not in CACHEABLE_STATUSES:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO verdict_cache (key, problem_id, status, memory, runtime, results, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, problem_id, status, memory, runtime, json.dumps(results), time.time())
+    )
+    # keep the newest MAX_ENTRIES
+    conn.execute(
+        "DELETE FROM verdict_cache WHERE created_at < "
+        "(SELECT created_at FROM verdict_cache ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+        (MAX_ENTRIES - 1,)
+    )
+
+
+def invalidate_problem(conn, problem_id):
+    """Drop every cached verdict for a problem whose test cases changed; caller commits."""
+    conn.execute("DELETE FROM verdict_cache WHERE problem_id = ?", (problem_id,))
+
+
+def stats(conn):
+    entries = conn.execute("SELECT COUNT(*) FROM verdict_cache").fetchone()[0]
+    row = conn.execute("SELECT hits, misses FROM verdict_cache_stats WHERE id = 1").fetchone()
+    hits, misses = (row["hits"], row["misses"]) if row else (0, 0)
+    lookups = hits + misses
+    return {
+        "size": entries,
+        "maxsize": MAX_ENTRIES,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+    }